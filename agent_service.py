@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from agents import set_default_openai_api, set_default_openai_client
+import telemetry
+from conversation_state import ConversationState
+from use_OpenAI_Agent import WorkflowInput, run_workflow
+
+# 見積エージェント（use_OpenAI_Agent.run_workflow）を常駐の HTTP サービスとして動かす
+#   ・Agent の定義と AsyncOpenAI クライアント（接続プール）は起動時に1回だけ作り、全リクエストで共有する
+#   ・同時に処理する質問の数を max_in_flight に制限し、待ちが max_queue を超えたら 503 を返す
+#   ・質問ごとにトレース（group_id = 会話ID、metadata = リクエストID）を分ける
+#   ・session_id を指定すると、同じ会話の履歴（ConversationState）を引き継ぐ
+#
+#   POST /v1/ask   {"question": "...", "session_id": "..."(省略可)}
+#                  → {"request_id", "session_id", "answer", "route", "speculative", "elapsed"}
+#   GET  /health   処理中・待ち・会話数など
+#   GET  /metrics  API 計測（telemetry）の Prometheus 形式
+
+#======================================================================
+class AgentService:
+    def __init__(self, max_in_flight=8, max_queue=64, speculative=False,
+                 history_token_budget=4000, response_chaining=False, max_sessions=1000):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.speculative = speculative
+        self.history_token_budget = history_token_budget
+        self.response_chaining = response_chaining
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()     # 会話ID → (ConversationState, asyncio.Lock)
+        self.session_users = {}           # 会話ID → 処理中・待ちの質問数（この間は捨てない）
+        self.in_flight = 0
+        self.waiting = 0
+        self.served = 0
+        self.failed = 0
+
+    # 会話の状態を取り出し、使用中として数える（使い終わったら _release_session）
+    def _session(self, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = (ConversationState(self.history_token_budget, self.response_chaining),
+                                         asyncio.Lock())
+        self.sessions.move_to_end(session_id)
+        self.session_users[session_id] = self.session_users.get(session_id, 0) + 1
+        self._evict_sessions()
+        return self.sessions[session_id]
+
+    def _release_session(self, session_id):
+        self.session_users[session_id] -= 1
+        if not self.session_users[session_id]:
+            del self.session_users[session_id]
+        self._evict_sessions()
+
+    # 古い会話から捨てる。処理中・待ちの質問がある会話（ロックを持つ・待つ）は残す
+    def _evict_sessions(self):
+        for session_id in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if session_id not in self.session_users:
+                del self.sessions[session_id]
+
+    # 質問1件を処理して結果の辞書を返す
+    # 同じ会話の質問は1件ずつ順に処理する（履歴の順序を保つため）。
+    async def ask(self, question, session_id=None):
+        if self.waiting >= self.max_queue:
+            raise OverflowError("too many pending questions")
+        request_id = uuid.uuid4().hex
+        session_id = session_id or request_id
+        state, lock = self._session(session_id)
+        started = time.perf_counter()
+        try:
+            # 同じセッションの前の質問（ロック）を待っている間も、待ちの数に含める
+            self.waiting += 1
+            try:
+                await lock.acquire()
+                try:
+                    await self.semaphore.acquire()
+                except BaseException:
+                    lock.release()
+                    raise
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                output = await run_workflow(WorkflowInput(input_as_text=question),
+                                            speculative=self.speculative, state=state,
+                                            group_id=session_id,
+                                            metadata={"request_id": request_id})
+                self.served += 1
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.semaphore.release()
+                lock.release()
+        finally:
+            self._release_session(session_id)
+        return {"request_id": request_id, "session_id": session_id,
+                "answer": output.output_text, "route": output.route,
+                "speculative": output.speculative,
+                "elapsed": round(time.perf_counter() - started, 3)}
+
+    def health(self):
+        return {"status": "ok", "in_flight": self.in_flight, "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight, "sessions": len(self.sessions),
+                "served": self.served, "failed": self.failed}
+
+    #==================================================================
+    # HTTP（1接続1リクエスト、JSON のみ）
+    async def handle_connection(self, reader, writer):
+        try:
+            status, body, content_type = await self._dispatch(reader)
+        except Exception as e:
+            status, body, content_type = 500, {"error": str(e)}, "application/json"
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+                   503: "Service Unavailable"}
+        writer.write(f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+                     f"Content-Type: {content_type}; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("ascii") + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            return 400, {"error": "bad request"}, "application/json"
+        method, path = request_line[0], request_line[1].split("?")[0]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if method == "GET" and path == "/health":
+            return 200, self.health(), "application/json"
+        if method == "GET" and path == "/metrics":
+            return 200, telemetry.prometheus_text(), "text/plain"
+        if method != "POST" or path != "/v1/ask":
+            return 404, {"error": "not found"}, "application/json"
+
+        length = int(headers.get("content-length", 0))
+        try:
+            payload = json.loads(await reader.readexactly(length) if length else b"{}")
+            question = payload["question"]
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError):
+            return 400, {"error": "question is required"}, "application/json"
+        try:
+            return 200, await self.ask(question, payload.get("session_id")), "application/json"
+        except OverflowError as e:
+            return 503, {"error": str(e)}, "application/json"
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+#======================================================================
+# AsyncOpenAI クライアントを1つ作り、全エージェントの既定のクライアントにする
+# chat_completions=True の時は Chat Completions API を使う（ローカルの代替サーバー向け。
+# File search などのホスト型ツールは使えない）。
+def configure_openai(api_key, base_url=None, chat_completions=False):
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    set_default_openai_client(client, use_for_tracing=base_url is None)
+    if chat_completions:
+        set_default_openai_api("chat_completions")
+    return client
+
+# 実行例
+#   python agent_service.py --port 8080
+#   curl -X POST localhost:8080/v1/ask -d '{"question": "昨年の見積で粗利額が大きいものを5つ"}'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="同時に処理する質問の数（省略時は config.ini）")
+    parser.add_argument("--max-queue", type=int, default=None, help="待たせる質問の上限（省略時は config.ini）")
+    parser.add_argument("--base-url", default=None, help="API の接続先（ローカルの代替サーバー等）")
+    parser.add_argument("--chat-completions", action="store_true",
+                        help="Responses API の代わりに Chat Completions API を使う")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("API_9519-01_TRY")
+    os.environ["OPENAI_API_KEY"] = api_key or ""
+
+    config = configparser.ConfigParser()
+    BASE_DIR = Path(__file__).resolve().parent
+    with open(BASE_DIR / 'config.ini', 'r', encoding='utf-8') as f:
+        config.read_file(f)
+    telemetry.configure_from_config(config, BASE_DIR, "agent_service")
+
+    service = AgentService(
+        max_in_flight=args.max_in_flight or config.getint('agent', 'max_in_flight', fallback=8),
+        max_queue=args.max_queue or config.getint('agent', 'max_queue', fallback=64),
+        speculative=config.getboolean('agent', 'speculative', fallback=False),
+        history_token_budget=config.getint('agent', 'history_token_budget', fallback=4000),
+        response_chaining=config.getboolean('agent', 'response_chaining', fallback=False))
+
+    async def main():
+        client = configure_openai(api_key, args.base_url, args.chat_completions)
+        print(f"見積エージェント: http://{args.host}:{args.port}/v1/ask")
+        try:
+            await service.serve(args.host, args.port)
+        finally:
+            await client.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        telemetry.finish()
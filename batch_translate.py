@@ -0,0 +1,238 @@
+import argparse
+import configparser
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from docx import Document
+from dotenv import load_dotenv
+from openai import OpenAI
+from docx_utils import collect_targets, replace_text_preserve_styles, uniquify
+from segmenter import output_token_limit
+from translate_engine import SYSTEM_PROMPT
+from translation_cache import normalize_text
+
+# Batch API を使った一括翻訳（夜間バッチ向け）
+# 処理は次の段階に分かれていて、それぞれ単独で再実行できる。
+#   prepare : .docx の段落を抜き出し、Batch API 用の requests.jsonl を作成する
+#   submit  : requests.jsonl をアップロードしてバッチジョブを作成する
+#   wait    : ジョブが終了するまで状態を確認する
+#   apply   : 結果ファイルをダウンロードし、翻訳を .docx に書き込む
+# 進捗は作業フォルダの state.json に保存するので、途中で止めても続きから実行できる。
+
+# バッチジョブの終了状態
+BATCH_DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+#======================================================================
+# 作業フォルダの state.json を読み書きする
+def load_state(workdir):
+    path = Path(workdir) / "state.json"
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(workdir, state):
+    path = Path(workdir) / "state.json"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+#======================================================================
+# 原文から custom_id を作る。同じ原文は文書をまたいでも同じ ID になる。
+def make_custom_id(text):
+    return "seg-" + hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()[:20]
+
+#======================================================================
+# 段階1: 各 .docx の段落を抜き出し、requests.jsonl と文書ごとの ID 一覧を作成する
+# max_tokens を省略すると、段落ごとに入力のトークン数から決める（長い段落が途中で切れないように）。
+# 作成済みのバッチ（state.json の batch_id）がある作業フォルダは、force=True の時だけ作り直す。
+def prepare(docx_paths, workdir, modelID, max_tokens=None, temperature=0.7, force=False):
+    workdir = Path(workdir)
+    batch_id = load_state(workdir).get("batch_id")
+    if batch_id and not force:
+        raise RuntimeError(f"{workdir} にはバッチ {batch_id} が作成済みです。"
+                           "別の --workdir を指定するか、--force で作り直してください")
+    workdir.mkdir(parents=True, exist_ok=True)
+    # 前のバッチの結果ファイルは使わない
+    (workdir / "results.jsonl").unlink(missing_ok=True)
+    documents = []
+    written = set()
+    with open(workdir / "requests.jsonl", "w", encoding="utf-8") as f:
+        for docx_path in docx_paths:
+            custom_ids = []
+            for _, text in collect_targets(Document(docx_path)):
+                custom_id = make_custom_id(text)
+                custom_ids.append(custom_id)
+                if custom_id in written:
+                    continue
+                written.add(custom_id)
+                f.write(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": modelID,
+                        "messages": [
+                            {"role":"system", "content":SYSTEM_PROMPT},
+                            {"role":"user",   "content":text}
+                        ],
+                        "max_tokens": max_tokens or output_token_limit(text),
+                        "temperature": temperature
+                    }
+                }, ensure_ascii=False) + "\n")
+            documents.append({"path": str(Path(docx_path).resolve()), "custom_ids": custom_ids})
+
+    state = {"model": modelID, "documents": documents}
+    save_state(workdir, state)
+    print(f"準備完了: 文書 {len(documents)} 件 / リクエスト {len(written)} 件")
+    return state
+
+# 保存済みの state.json が docx_paths の文書のものか確かめる（違えばエラー）
+def check_documents(workdir, docx_paths):
+    saved = [document["path"] for document in load_state(workdir).get("documents", [])]
+    given = [str(Path(path).resolve()) for path in docx_paths]
+    if saved != given:
+        raise RuntimeError(f"{workdir} の state.json は別の文書のものです: {', '.join(saved)}。"
+                           "別の --workdir を指定するか、prepare --force で作り直してください")
+
+#======================================================================
+# 段階2: requests.jsonl をアップロードし、バッチジョブを作成する
+# アップロード済み・作成済みの場合はその段階を飛ばす。
+def submit(client, workdir):
+    state = load_state(workdir)
+    if "input_file_id" not in state:
+        with open(Path(workdir) / "requests.jsonl", "rb") as f:
+            upload = client.files.create(file=f, purpose="batch")
+        state["input_file_id"] = upload.id
+        save_state(workdir, state)
+    if "batch_id" not in state:
+        batch = client.batches.create(
+            input_file_id=state["input_file_id"],
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        state["batch_id"] = batch.id
+        save_state(workdir, state)
+    print("Batch ID:", state["batch_id"])
+    return state
+
+#======================================================================
+# 段階3: バッチジョブが終了するまで interval 秒ごとに状態を確認する
+def wait(client, workdir, interval=60):
+    state = load_state(workdir)
+    while True:
+        batch = client.batches.retrieve(state["batch_id"])
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"Status: {batch.status} ({counts.completed}/{counts.total}, failed {counts.failed})")
+        else:
+            print("Status:", batch.status)
+        if batch.status in BATCH_DONE_STATUSES:
+            break
+        time.sleep(interval)
+    state["status"] = batch.status
+    state["output_file_id"] = batch.output_file_id
+    state["error_file_id"] = batch.error_file_id
+    save_state(workdir, state)
+    return state
+
+#======================================================================
+# 結果ファイルを1行ずつ読み、custom_id ごとの翻訳を返す
+def read_results(path):
+    translations = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            content = response["body"]["choices"][0]["message"]["content"]
+            translations[result["custom_id"]] = content.strip()
+    return translations
+
+#======================================================================
+# 段階4: 結果ファイルをダウンロードし（済みなら再利用）、各 .docx に翻訳を書き込む
+def apply(client, workdir):
+    workdir = Path(workdir)
+    state = load_state(workdir)
+    results_path = workdir / "results.jsonl"
+    if not results_path.exists():
+        if not state.get("output_file_id"):
+            raise RuntimeError(f"結果ファイルがありません (status: {state.get('status')})")
+        tmp_path = workdir / "results.jsonl.tmp"
+        with client.files.with_streaming_response.content(state["output_file_id"]) as response:
+            response.stream_to_file(tmp_path)
+        os.replace(tmp_path, results_path)
+    translations = read_results(results_path)
+
+    outputs = state.get("outputs", {})
+    for document in state["documents"]:
+        if document["path"] in outputs:
+            continue
+        doc = Document(document["path"])
+        targets = collect_targets(doc)
+        missing = 0
+        for (para, _), custom_id in zip(targets, document["custom_ids"]):
+            translated = translations.get(custom_id)
+            if translated is None:
+                missing += 1
+                continue
+            replace_text_preserve_styles(para, translated)
+        input_path = Path(document["path"])
+        output_path = uniquify(input_path.parent / f"output_{input_path.name}")
+        doc.save(output_path)
+        outputs[document["path"]] = str(output_path)
+        state["outputs"] = outputs
+        save_state(workdir, state)
+        print(f"完了: {output_path} (未翻訳 {missing} 段落)")
+    return state
+
+# Example usage
+#   python batch_translate.py prepare a.docx b.docx
+#   python batch_translate.py submit
+#   python batch_translate.py wait
+#   python batch_translate.py apply
+#   python batch_translate.py run a.docx b.docx   # 全段階をまとめて実行
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("stage", choices=["prepare", "submit", "wait", "apply", "run"])
+    parser.add_argument("docx", nargs="*", help="翻訳する .docx（省略時は config.ini の word_jp）")
+    parser.add_argument("--workdir", default="batch_job")
+    parser.add_argument("--interval", type=int, default=60)
+    parser.add_argument("--base-url", default=None, help="API の接続先（ローカルの代替サーバー等）")
+    parser.add_argument("--force", action="store_true",
+                        help="作成済みのバッチがある作業フォルダでも prepare をやり直す")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    config = configparser.ConfigParser()
+    BASE_DIR = Path(__file__).resolve().parent
+    with open(BASE_DIR / 'config.ini', 'r', encoding='utf-8') as f:
+        config.read_file(f)
+
+    env_key = "API_9519-01_TRY"
+    client = OpenAI(api_key=os.getenv(env_key), base_url=args.base_url)
+
+    env_model_id = "API_9519-01_TRY_MODEL"
+    modelID = os.getenv(env_model_id)
+
+    docx_paths = args.docx or [BASE_DIR / config['input']['word_jp']]
+    workdir = BASE_DIR / args.workdir
+
+    if args.stage == "prepare" or (args.stage == "run" and not (workdir / "state.json").exists()):
+        prepare(docx_paths, workdir, modelID, force=args.force)
+    elif args.stage == "run" and args.docx:
+        # 続きから実行する時は、指定の文書が保存済みの状態と同じ時だけ
+        check_documents(workdir, docx_paths)
+    if args.stage in ("submit", "run"):
+        submit(client, workdir)
+    if args.stage in ("wait", "run"):
+        wait(client, workdir, args.interval)
+    if args.stage in ("apply", "run"):
+        apply(client, workdir)
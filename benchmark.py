@@ -0,0 +1,228 @@
+import argparse
+import configparser
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from docx import Document
+from docx_stream import extract_paragraphs
+from mock_openai_server import MockOpenAIServer
+
+# 翻訳処理（use_fine-tuning.py）のベンチマーク
+#   ・合成した .docx（段落数・表の割合を指定）を、ローカルの OpenAI 互換サーバーに対して翻訳する
+#   ・段落/秒、リクエスト遅延の p50/p95/p99、最大メモリ使用量（peak RSS）、経過時間を
+#     1ケース1行の JSON で出力するので、版ごとの結果を比べられる
+#   ・翻訳メモリ・日英対照表は使わない（毎回すべての段落を API で翻訳する）
+# リクエスト遅延はモックサーバー側で、リクエスト受信から応答送信までを測る。
+
+BASE_DIR = Path(__file__).resolve().parent
+SCRIPT = BASE_DIR / "use_fine-tuning.py"
+
+# 合成文書の文章に使う語句
+WORDS = [
+    "当第3四半期", "連結累計期間", "売上高", "営業利益", "経常利益", "親会社株主に帰属する四半期純利益",
+    "前年同期比", "増加", "減少", "となりました", "海外事業", "国内事業", "為替の影響",
+    "原材料価格の高騰", "設備投資", "研究開発費", "販売費及び一般管理費", "セグメント", "の業績は",
+    "により", "が堅調に推移し", "百万円", "％", "また", "なお", "当社グループ", "需要の回復",
+]
+
+# 子プロセスで use_fine-tuning.py を実行し、終了時に最大メモリ使用量をファイルに書き出す
+RUNNER = """
+import os, runpy, sys
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(script))
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux は KB、macOS はバイト単位
+        rss = rss if sys.platform == "darwin" else rss * 1024
+        with open(os.environ["BENCH_RSS_FILE"], "w") as f:
+            f.write(str(rss))
+"""
+
+#======================================================================
+# 合成 .docx を作る
+# paragraphs 個の段落と、段落数 × table_density 個の表（rows × cols）をランダムな位置に入れる。
+# duplicate_ratio の割合で、既出の段落と同じ文章を繰り返す（実際の文書の定型文に相当）。
+def generate_docx(path, paragraphs, table_density=0.0, rows=4, cols=3,
+                  duplicate_ratio=0.1, seed=0):
+    rng = random.Random(seed)
+    doc = Document()
+    written = []
+
+    def sentence():
+        if written and rng.random() < duplicate_ratio:
+            return rng.choice(written)
+        text = "".join(rng.choice(WORDS) for _ in range(rng.randint(4, 24))) + "。"
+        written.append(text)
+        return text
+
+    tables = round(paragraphs * table_density)
+    table_positions = set(rng.sample(range(paragraphs + tables), tables)) if tables else set()
+    for position in range(paragraphs + tables):
+        if position in table_positions:
+            table = doc.add_table(rows=rows, cols=cols)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(WORDS)
+        else:
+            doc.add_paragraph(sentence())
+    doc.save(path)
+    return path
+
+#======================================================================
+# 昇順に並べた values の p パーセンタイル（最近傍順位法）
+def percentile(values, p):
+    if not values:
+        return None
+    rank = math.ceil(p / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+#======================================================================
+# ベンチマーク用の設定ファイルを作る
+# config.ini を元に、入力文書を差し替え、翻訳メモリ・日英対照表・ローカル変換（fast_path）を無効にする。
+# API 計測（[telemetry]）の出力先とジャーナルは、設定ファイルと同じフォルダの metrics・journal にする。
+# overrides は {"section.key": value} で、任意の設定を上書きする。
+def write_config(path, docx_path, overrides=None):
+    config = configparser.ConfigParser()
+    with open(BASE_DIR / "config.ini", "r", encoding="utf-8") as f:
+        config.read_file(f)
+    settings = {"input.word_jp": str(Path(docx_path).resolve()),
+                "cache.enabled": "no",
+                "glossary.inject": "no",
+                "glossary.verify": "no",
+                "fast_path.enabled": "no",
+                "telemetry.dir": str(Path(path).resolve().parent / "metrics"),
+                "journal.dir": str(Path(path).resolve().parent / "journal")}
+    settings.update(overrides or {})
+    for name, value in settings.items():
+        section, key = name.split(".", 1)
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, key, str(value))
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+    return path
+
+#======================================================================
+# 1ケースを実行して結果の辞書を返す
+def run_case(server, workdir, paragraphs, table_density, overrides=None, seed=0, timeout=None):
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    docx_path = generate_docx(workdir / f"bench_{paragraphs}_{table_density}.docx",
+                              paragraphs, table_density, seed=seed)
+    config_path = write_config(workdir / "bench_config.ini", docx_path, overrides)
+    output_dir = workdir / "output"
+    output_dir.mkdir(exist_ok=True)
+    rss_path = workdir / "peak_rss"
+    if rss_path.exists():
+        rss_path.unlink()
+    targets = [text for _, text in extract_paragraphs(docx_path) if text.strip()]
+
+    env = dict(os.environ)
+    env.update({"OPENAI_BASE_URL": server.base_url,
+                "API_9519-01_TRY": "mock-key",
+                "API_9519-01_TRY_MODEL": "mock-model",
+                "BENCH_RSS_FILE": str(rss_path)})
+    server.reset()
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", RUNNER, str(SCRIPT),
+                           "--config", str(config_path), "--output-dir", str(output_dir)],
+                          cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True, timeout=timeout)
+    wall_time = time.perf_counter() - started
+
+    stats = server.stats()
+    latencies = sorted(stats["latencies"])
+    result = {
+        "size": paragraphs,
+        "paragraphs": len(targets),
+        "table_density": table_density,
+        "returncode": proc.returncode,
+        "wall_time": round(wall_time, 3),
+        "paragraphs_per_sec": round(len(targets) / wall_time, 2) if wall_time else None,
+        "requests": stats["requests"],
+        "errors": stats["errors"],
+        "rate_limited": stats["rate_limited"],
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "peak_rss": int(rss_path.read_text()) if rss_path.exists() else None,
+    }
+    if proc.returncode != 0:
+        result["stderr"] = proc.stderr[-2000:]
+    return result
+
+#======================================================================
+# 実行環境の情報（結果と一緒に記録する）
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform()}
+
+def parse_overrides(items):
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        overrides[name.strip()] = value.strip()
+    return overrides
+
+# 実行例
+#   python benchmark.py --sizes 100,1000 --table-density 0,0.3 --latency 0.2 --error-rate 0.01 \
+#       --set translate.concurrency=16 --output bench.jsonl
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,500", help="段落数（カンマ区切り）")
+    parser.add_argument("--table-density", default="0,0.2", help="段落数に対する表の数の割合（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", metavar="SECTION.KEY=VALUE",
+                        help="ベンチマーク用 config.ini の設定を上書きする（複数指定可）")
+    parser.add_argument("--workdir", default=None, help="作業フォルダ（省略時は一時フォルダ）")
+    parser.add_argument("--output", default=None, help="結果を追記する JSON Lines ファイル")
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.set)
+    server = MockOpenAIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              rpm=args.rpm, tpm=args.tpm, seed=args.seed)
+    server.start()
+    info = environment_info()
+    info.update(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                rpm=args.rpm, tpm=args.tpm, overrides=overrides)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = Path(args.workdir or tmpdir)
+        try:
+            for size in (int(s) for s in args.sizes.split(",")):
+                for density in (float(d) for d in args.table_density.split(",")):
+                    for run in range(args.repeat):
+                        result = run_case(server, workdir, size, density, overrides, seed=args.seed)
+                        record = dict(info, run=run, **result)
+                        line = json.dumps(record, ensure_ascii=False)
+                        print(line, flush=True)
+                        if args.output:
+                            with open(args.output, "a", encoding="utf-8") as f:
+                                f.write(line + "\n")
+        finally:
+            server.stop()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import shutil
+from pathlib import Path
+from token_utils import BUNDLED_CACHE_DIR, DEFAULT_ENCODING, bundle_encoding
+
+# 翻訳ツール（use_fine-tuning.py）の実行ファイルを PyInstaller で作る
+#   ・tiktoken のエンコーディングを tiktoken_cache に保存して同梱する（配布先ではダウンロードしない）
+#   ・翻訳に使わない重いパッケージ（Agents SDK など）は含めない
+#   ・既定は --onedir。--onefile は起動のたびに一時フォルダへ展開するため、起動が遅くなる
+#   ・まとめるスクリプトは __main__ の最初で multiprocessing.freeze_support() を呼ぶ（プロセスプールを使うため）
+# config.ini・日英対照表・コンパイル済み日英対照表（<Excel名>.glossary）は dist/use_fine-tuning/ に置く。
+# コンパイル済みの日英対照表を置いておけば、配布先では pandas で Excel を読まずに済む。
+
+SCRIPT = Path(__file__).resolve().parent / "use_fine-tuning.py"
+NAME = "use_fine-tuning"
+
+# 実行ファイルに含めないパッケージ
+EXCLUDED_MODULES = ["agents", "matplotlib", "IPython", "tkinter", "pytest"]
+
+#======================================================================
+def pyinstaller_args(onefile=False, exclude_pandas=False):
+    args = [str(SCRIPT), "--name", NAME, "--noconfirm", "--clean",
+            "--onefile" if onefile else "--onedir",
+            "--add-data", f"{BUNDLED_CACHE_DIR}{os.pathsep}tiktoken_cache",
+            # tiktoken はエンコーディングの定義をプラグイン（tiktoken_ext）から探す
+            "--hidden-import", "tiktoken_ext",
+            "--hidden-import", "tiktoken_ext.openai_public"]
+    for module in EXCLUDED_MODULES + (["pandas"] if exclude_pandas else []):
+        args += ["--exclude-module", module]
+    return args
+
+# 実行例
+#   python build_exe.py                 # dist/use_fine-tuning/use_fine-tuning(.exe)
+#   python build_exe.py --onefile       # 1ファイル版（起動は遅い）
+#   python startup_benchmark.py --exe dist/use_fine-tuning/use_fine-tuning
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--onefile", action="store_true", help="1ファイルの実行ファイルにする")
+    parser.add_argument("--exclude-pandas", action="store_true",
+                        help="pandas を含めない（コンパイル済みの日英対照表を一緒に配布する場合）")
+    parser.add_argument("--encoding", action="append", default=None,
+                        help=f"同梱する tiktoken のエンコーディング（省略時は {DEFAULT_ENCODING}）")
+    args = parser.parse_args()
+
+    for encoding_name in args.encoding or [DEFAULT_ENCODING]:
+        bundle_encoding(encoding_name)
+    print(f"tiktoken のデータ: {BUNDLED_CACHE_DIR}")
+
+    import PyInstaller.__main__
+    PyInstaller.__main__.run(pyinstaller_args(args.onefile, args.exclude_pandas))
+
+    if not args.onefile:
+        dist_dir = SCRIPT.parent / "dist" / NAME
+        shutil.copy2(SCRIPT.parent / "config.ini", dist_dir / "config.ini")
+        print(f"完了: {dist_dir}（日英対照表・翻訳する文書はこのフォルダに置く）")
@@ -0,0 +1,102 @@
+import json
+from token_utils import count_tokens
+
+# エージェントに渡す会話履歴の管理
+#   ・各段階の結果は reasoning 項目を除いて履歴に加える（後段のエージェントには不要で、トークン数が大きい）
+#   ・エージェントごとのトークン数上限に収まるよう、古い項目から削って入力を作る
+#     （現在の質問と、その段階で追加する項目は必ず残す）
+#     過去のターンは質問と回答を、ツール呼び出しは function_call と function_call_output を組で削る
+#     （片方だけ残すと API が入力を受け付けない）
+#   ・過去のターンは (質問, 回答) だけを残す。chain=True の時は、前のターンの回答の response id を
+#     previous_response_id として渡し、過去のターンをサーバー側の履歴から参照する（再送しない）
+
+# 履歴に残さない項目の種類
+DROPPED_ITEM_TYPES = ("reasoning",)
+
+#======================================================================
+def user_message(text):
+    return {"role": "user", "content": [{"type": "input_text", "text": text}]}
+
+# 内容は文字列で持つ（Responses API と Chat Completions API のどちらにもそのまま渡せる）
+def assistant_message(text):
+    return {"role": "assistant", "content": text}
+
+# Runner.run の結果のうち、後段に渡す項目（reasoning を除く）
+def result_items(result):
+    items = [item.to_input_item() for item in result.new_items]
+    return [item for item in items if item.get("type") not in DROPPED_ITEM_TYPES]
+
+# 入力項目のトークン数（JSON にした長さで概算する）
+def item_tokens(item):
+    return count_tokens(json.dumps(item, ensure_ascii=False))
+
+# 項目を、まとめて削るまとまりに分ける（順序は保つ）
+# 同じ call_id を持つ項目（ツールの呼び出しと結果）が別のまとまりに分かれないよう、
+# まとまりの中に呼び出しがあれば、その結果の項目までを同じまとまりに含める。
+def call_groups(items):
+    last_index = {}
+    for i, item in enumerate(items):
+        if item.get("call_id"):
+            last_index[item["call_id"]] = i
+    groups = []
+    start = 0
+    while start < len(items):
+        end = start
+        i = start
+        while i <= end:
+            end = max(end, last_index.get(items[i].get("call_id"), i))
+            i += 1
+        groups.append(items[start:end + 1])
+        start = end + 1
+    return groups
+
+#======================================================================
+class ConversationState:
+    def __init__(self, token_budget=4000, chain=False):
+        self.token_budget = token_budget
+        self.chain = chain
+        self.turns = []                    # 過去のターン [(質問, 回答), ...]
+        self.items = []                    # 現在のターンの履歴
+        self.previous_response_id = None   # 前のターンの回答の response id（chain=True の時）
+
+    # 新しいターンを始める
+    def start_turn(self, text):
+        self.items = [user_message(text)]
+
+    # Runner.run の結果を現在のターンの履歴に加える
+    def add_result(self, result):
+        self.items.extend(result_items(result))
+
+    # ターンを終える。次のターンには質問と回答だけを引き継ぐ。
+    def end_turn(self, answer, result=None):
+        question = self.items[0]["content"][0]["text"] if self.items else ""
+        self.turns.append((question, answer))
+        if self.chain and result is not None:
+            self.previous_response_id = result.last_response_id
+
+    # Runner.run に渡す追加の引数（response の連鎖）
+    def run_kwargs(self):
+        if self.chain and self.previous_response_id:
+            return {"previous_response_id": self.previous_response_id}
+        return {}
+
+    # エージェントへの入力を作る
+    # extra はこの段階で追加する項目（削らない）。budget はトークン数の上限（省略時は token_budget）。
+    def input_items(self, *extra, budget=None):
+        budget = budget or self.token_budget
+        history = []
+        if not (self.chain and self.previous_response_id):
+            history = [[user_message(question), assistant_message(answer)] for question, answer in self.turns]
+        current, rest = self.items[:1], self.items[1:]
+
+        # 削れるまとまり（過去のターン → 現在のターンの途中経過）を古い順に並べて、上限を超える分を先頭から除く
+        droppable = history + call_groups(rest)
+        tokens = [sum(item_tokens(item) for item in group) for group in droppable]
+        total = sum(tokens) + sum(item_tokens(item) for item in [*current, *extra])
+        start = 0
+        while start < len(droppable) and total > budget:
+            total -= tokens[start]
+            start += 1
+        kept_history = [item for group in droppable[start:len(history)] for item in group]
+        kept_rest = [item for group in droppable[max(start, len(history)):] for item in group]
+        return [*kept_history, *current, *kept_rest, *extra]
@@ -0,0 +1,239 @@
+import copy
+import shutil
+import zipfile
+from xml.sax.saxutils import escape
+from lxml import etree
+
+# python-docx を使わずに .docx を処理する軽量エンジン
+# word/document.xml を iterparse で先頭から1回だけ読み、本文直下の要素（段落・表）ごとに
+# 処理してはメモリから捨てる。画像などの他のパーツは zip から zip へそのままコピーする。
+#
+# 対象とする段落は docx_utils.iter_paragraphs と同じ
+#   ・本文直下の段落（w:body/w:p）
+#   ・本文直下の表のセル直下の段落（w:body/w:tbl/w:tr/w:tc/w:p）
+# 段落 ID は、対象段落（空の段落も含む）の文書内での通し番号。
+
+DOCUMENT_XML = "word/document.xml"
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+W_BODY = _w("body")
+W_P = _w("p")
+W_R = _w("r")
+W_RPR = _w("rPr")
+W_T = _w("t")
+W_TAB = _w("tab")
+W_PTAB = _w("ptab")
+W_BR = _w("br")
+W_CR = _w("cr")
+W_NO_BREAK_HYPHEN = _w("noBreakHyphen")
+W_HYPERLINK = _w("hyperlink")
+W_TBL = _w("tbl")
+W_TR = _w("tr")
+W_TC = _w("tc")
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+XML_SPACE = f"{{{XML_NS}}}space"
+ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+#======================================================================
+# run / 段落のテキストを python-docx の Run.text / Paragraph.text と同じ規則で取り出す
+def run_text(r):
+    parts = []
+    for child in r:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag in (W_TAB, W_PTAB):
+            parts.append("\t")
+        elif child.tag == W_CR:
+            parts.append("\n")
+        elif child.tag == W_BR:
+            if child.get(_w("type"), "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+def paragraph_text(p):
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+#======================================================================
+# run のテキストを置き換える（python-docx の Run.text への代入と同じ結果にする）
+# w:rPr 以外の子要素を削除し、タブは w:tab、改行は w:br、それ以外は w:t にする。
+def set_run_text(r, text):
+    for child in list(r):
+        if child.tag != W_RPR:
+            r.remove(child)
+    buffer = []
+
+    def flush():
+        if buffer:
+            t = etree.SubElement(r, W_T)
+            t.text = "".join(buffer)
+            if len(t.text.strip()) < len(t.text):
+                t.set(XML_SPACE, "preserve")
+            buffer.clear()
+
+    for char in text:
+        if char == "\t":
+            flush()
+            etree.SubElement(r, W_TAB)
+        elif char in "\r\n":
+            flush()
+            etree.SubElement(r, W_BR)
+        else:
+            buffer.append(char)
+    flush()
+
+#======================================================================
+# docx_utils.replace_text_preserve_styles の XML 版
+def replace_paragraph_text(p, new_text):
+    full_text = paragraph_text(p)
+    if not full_text.strip():
+        return
+    runs = [child for child in p if child.tag == W_R]
+    if len(full_text) != len(new_text):
+        for r in runs:
+            set_run_text(r, "")
+        set_run_text(etree.SubElement(p, W_R), new_text)
+    else:
+        idx = 0
+        for r in runs:
+            run_len = len(run_text(r))
+            set_run_text(r, new_text[idx:idx+run_len])
+            idx += run_len
+
+#======================================================================
+# 本文直下の要素から、翻訳対象の段落を文書順に取り出す
+def _target_paragraphs(element):
+    if element.tag == W_P:
+        yield element
+    elif element.tag == W_TBL:
+        for tr in element.iterchildren(W_TR):
+            for tc in tr.iterchildren(W_TC):
+                for p in tc.iterchildren(W_P):
+                    yield p
+
+#======================================================================
+# document.xml を iterparse で読み、次のイベントを順に返す
+#   ("start", elem) : w:document / w:body の開始
+#   ("end", elem)   : w:document / w:body の終了
+#   ("item", elem)  : それ以外の本文直下（または w:document 直下）の要素が読み終わった時
+# "item" の要素は、呼び出し側の処理が終わった後にメモリから解放する。
+def _iter_document(stream):
+    depth = 0
+    in_body = False
+    for event, elem in etree.iterparse(stream, events=("start", "end"), huge_tree=True):
+        if event == "start":
+            depth += 1
+            if depth == 1 or (depth == 2 and elem.tag == W_BODY):
+                in_body = in_body or elem.tag == W_BODY
+                yield "start", elem
+            continue
+        depth -= 1
+        if depth == 0 or (depth == 1 and elem.tag == W_BODY):
+            yield "end", elem
+        elif depth == 1 or (depth == 2 and in_body):
+            yield "item", elem
+            elem.clear()
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+#======================================================================
+# .docx から翻訳対象の段落を取り出し、[(段落ID, テキスト), ...] で返す（空の段落は除く）
+def extract_paragraphs(docx_path):
+    targets = []
+    pid = 0
+    with zipfile.ZipFile(docx_path) as zin, zin.open(DOCUMENT_XML) as stream:
+        for kind, elem in _iter_document(stream):
+            if kind != "item":
+                continue
+            for p in _target_paragraphs(elem):
+                text = paragraph_text(p).strip()
+                if text:
+                    targets.append((pid, text))
+                pid += 1
+    return targets
+
+#======================================================================
+# 要素の開始タグ・終了タグを、元の接頭辞のまま文字列で組み立てる
+# 開始タグには nsmap の名前空間宣言だけを付ける。
+def _prefixed_name(elem, name):
+    qname = etree.QName(name)
+    if qname.namespace is None:
+        return qname.localname
+    if qname.namespace == XML_NS:
+        return "xml:" + qname.localname
+    prefix = {uri: prefix for prefix, uri in elem.nsmap.items()}[qname.namespace]
+    return f"{prefix}:{qname.localname}" if prefix else qname.localname
+
+def _start_tag(elem, nsmap):
+    parts = ["<" + _prefixed_name(elem, elem.tag)]
+    for prefix, uri in nsmap.items():
+        name = f"xmlns:{prefix}" if prefix else "xmlns"
+        parts.append(f'{name}="{escape(uri, ATTR_ENTITIES)}"')
+    for name, value in elem.attrib.items():
+        parts.append(f'{_prefixed_name(elem, name)}="{escape(value, ATTR_ENTITIES)}"')
+    return (" ".join(parts) + ">").encode("utf-8")
+
+def _end_tag(elem):
+    return f"</{_prefixed_name(elem, elem.tag)}>".encode("utf-8")
+
+#======================================================================
+# 要素を、親要素で宣言済みの名前空間を繰り返さずに書き出す
+# 親と同じ名前空間を持つ入れ物に複製を入れてシリアライズし、入れ物のタグを取り除く。
+def _serialize_item(elem, holders):
+    parent = elem.getparent()
+    holder = holders.get(parent.tag)
+    if holder is None:
+        holder = holders[parent.tag] = etree.Element(parent.tag, nsmap=parent.nsmap)
+    holder.append(copy.deepcopy(elem))
+    data = etree.tostring(holder, encoding="UTF-8", xml_declaration=False, with_tail=False)
+    del holder[0]
+    return data[data.index(b">") + 1:-len(_end_tag(holder))]
+
+#======================================================================
+# document.xml を読みながら、translations {段落ID: 翻訳} を反映して書き出す
+def _rewrite_document(src_stream, dst_stream, translations):
+    holders = {}
+    pid = 0
+    dst_stream.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n')
+    for kind, elem in _iter_document(src_stream):
+        if kind == "start":
+            parent = elem.getparent()
+            parent_nsmap = parent.nsmap if parent is not None else {}
+            nsmap = {k: v for k, v in elem.nsmap.items() if parent_nsmap.get(k) != v}
+            dst_stream.write(_start_tag(elem, nsmap))
+        elif kind == "end":
+            dst_stream.write(_end_tag(elem))
+        else:
+            for p in _target_paragraphs(elem):
+                if pid in translations:
+                    replace_paragraph_text(p, translations[pid])
+                pid += 1
+            dst_stream.write(_serialize_item(elem, holders))
+
+#======================================================================
+# src_path の .docx に翻訳を反映し、dst_path に保存する
+# document.xml 以外のパーツは圧縮方式も含めてそのままコピーする。
+def write_translations(src_path, dst_path, translations):
+    with zipfile.ZipFile(src_path) as zin, \
+         zipfile.ZipFile(dst_path, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            with zin.open(info) as src:
+                if info.filename == DOCUMENT_XML:
+                    out_info = zipfile.ZipInfo(info.filename, info.date_time)
+                    out_info.compress_type = zipfile.ZIP_DEFLATED
+                    with zout.open(out_info, "w", force_zip64=True) as dst:
+                        _rewrite_document(src, dst, translations)
+                else:
+                    with zout.open(info, "w", force_zip64=info.file_size > 0x7FFFFFFF) as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
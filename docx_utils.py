@@ -0,0 +1,97 @@
+import os
+from translation_cache import normalize_text
+
+#======================================================================
+# Word文書（Document）から、本文とすべての表内段落を順に取り出す
+# 横方向に結合されたセルは row.cells で同じセルが複数回返るため、
+# 元の w:p 要素が同じ段落は最初の1回だけ返す。
+def iter_paragraphs(doc):
+    for para in doc.paragraphs:
+        yield para
+    seen = set()
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    if para._p in seen:
+                        continue
+                    seen.add(para._p)
+                    yield para
+
+#======================================================================
+# 翻訳対象の段落（空でないもの）を [(para, text), ...] のリストで返す
+def collect_targets(doc):
+    targets = []
+    for para in iter_paragraphs(doc):
+        text = para.text.strip()
+        if text:
+            targets.append((para, text))
+    return targets
+
+#======================================================================
+# 段落のリスト [(para, text), ...] を、正規化後のテキストが同じものごとにまとめる。
+# 重複を除いた原文のリストと、各段落がそのリストの何番目に当たるかを返す。
+def group_segments(targets):
+    index_of = {}
+    segments = []
+    segment_ids = []
+    for _, text in targets:
+        key = normalize_text(text)
+        if key not in index_of:
+            index_of[key] = len(segments)
+            segments.append(text)
+        segment_ids.append(index_of[key])
+    return segments, segment_ids
+
+#======================================================================
+# 段落内の日本語テキストを、英語翻訳テキストに置き換える。
+# 元の runs（書式）を可能な限り維持する。
+def replace_text_preserve_styles(paragraph, new_text):
+    full_text = paragraph.text
+    if not full_text.strip():
+        return
+    if len(full_text) != len(new_text):
+        # 長さが変わる時は runs に分解して置換
+        # 簡略化のため、一度空runsクリアして全体追加
+        for run in paragraph.runs:
+            run.text = ""
+        paragraph.add_run(new_text)
+    else:
+        # 長さが同じなら runsごとに直接置換
+        idx = 0
+        for run in paragraph.runs:
+            run_len = len(run.text)
+            run.text = new_text[idx:idx+run_len]
+            idx += run_len
+
+#======================================================================
+# python-docx で文書を読み、翻訳対象の段落を [(段落番号, text), ...] で返す
+# docx_stream.extract_paragraphs と同じ形なので、プロセスプールでどちらのエンジンも使える。
+def extract_paragraphs_docx(docx_path):
+    from docx import Document
+    return [(i, text) for i, (_, text) in enumerate(collect_targets(Document(docx_path)))]
+
+# 翻訳 {段落番号: 英語} を python-docx で書き込み、dst_path に保存する（docx_stream.write_translations と同じ形）
+def write_translations_docx(src_path, dst_path, translations):
+    from docx import Document
+    doc = Document(src_path)
+    for i, (para, _) in enumerate(collect_targets(doc)):
+        if i in translations:
+            replace_text_preserve_styles(para, translations[i])
+    doc.save(dst_path)
+
+#======================================================================
+# 指定のパスが既に存在する場合、自動で連番を追加して一意のファイル名を生成する
+def uniquify(path):
+    """
+    指定された path が存在しなければそのまま返す。
+    存在する場合、"filename (2).ext", "filename (3).ext", ... のようにして
+    存在しない最初の名前を返す。
+    """
+    filename, extension = os.path.splitext(path)
+    counter = 1
+    new_path = path
+    while os.path.exists(new_path):
+        new_path = f"{filename} ({counter}){extension}"
+        counter += 1
+    return new_path
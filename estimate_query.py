@@ -0,0 +1,252 @@
+import argparse
+import configparser
+import json
+import os
+import pickle
+import re
+import unicodedata
+from datetime import date
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# 見積データ（estimate_data.json）の集計エンジン
+#   ・JSON を列ごとの NumPy 配列に変換し、日付・顧客・金額の索引を作る
+#       日付: 並べ替えた日付と行番号（範囲は二分探索で求める）
+#       顧客: 顧客名ごとの番号（部分一致は顧客名の一覧だけを調べる）
+#       金額: 数値の列ごとに降順の並び（上位 k 件は先頭から条件に合う行を取る）
+#   ・変換結果は「<JSON名>.estimates.pkl」に保存し、JSON が変わるまで再利用する
+#   ・条件（期間・顧客・案件名）で絞り込んだ上位 k 件・合計・平均・件数を正確に返す
+#   ・日付は "2024年4月1日"・"令和6年4月1日" のような日本語の書き方も読む。読めない日付の行は
+#     期間で絞り込んだ結果から外れるので、その件数を結果の rows_without_date に入れる
+
+CACHE_VERSION = 2
+OPERATIONS = ("top", "sum", "avg", "count")
+
+ERAS = {"令和": 2018, "平成": 1988, "昭和": 1925}
+ERA_YEAR = re.compile(r"(令和|平成|昭和)\s*(\d{1,2}|元)\s*年")
+JAPANESE_DATE = re.compile(r"(\d{4})\s*年\s*(\d{1,2})\s*月(?:\s*(\d{1,2})\s*日)?")
+
+#======================================================================
+# 部分一致用の正規化（全角/半角・大文字/小文字の揺れを吸収する）
+def _normalize(text):
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+# "1,234,000円" のような文字列も数値にする
+def _to_number(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    cleaned = series.astype(str).str.replace(r"[,，円¥￥\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+# 日本語の日付を "YYYY-MM-DD" にしてから日時にする（月までの指定は1日とする）
+def _to_datetime(series):
+    def normalize(value):
+        if not isinstance(value, str):
+            return value
+        text = unicodedata.normalize("NFKC", value).strip()
+        text = ERA_YEAR.sub(lambda m: f"{ERAS[m[1]] + (1 if m[2] == '元' else int(m[2]))}年", text)
+        return JAPANESE_DATE.sub(lambda m: f"{m[1]}-{int(m[2]):02d}-{int(m[3] or 1):02d}", text)
+    return pd.to_datetime(series.map(normalize), errors="coerce")
+
+#======================================================================
+# JSON を読み込んで DataFrame にする（入れ子のオブジェクトは "親.子" の列にする）
+# 最上位がオブジェクトで、見積のリストを1つだけ含む場合はそのリストを使う。
+def load_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if len(lists) == 1 else [data]
+    return pd.json_normalize(data)
+
+#======================================================================
+class EstimateTable:
+    def __init__(self, frame, date_field="日付", customer_field="顧客名",
+                 title_field="案件名", amount_fields=()):
+        self.frame = frame.reset_index(drop=True)
+        self.date_field = date_field
+        self.customer_field = customer_field
+        self.title_field = title_field
+        self.amount_fields = [f for f in amount_fields if f in self.frame.columns]
+        self._build()
+
+    def _build(self):
+        frame = self.frame
+        rows = len(frame)
+
+        # 日付の索引
+        if self.date_field in frame.columns:
+            dates = _to_datetime(frame[self.date_field]).to_numpy("datetime64[ns]")
+            present = frame[self.date_field].notna().to_numpy() & \
+                (frame[self.date_field].astype(str).str.strip() != "").to_numpy()
+        else:
+            dates = np.full(rows, np.datetime64("NaT"), dtype="datetime64[ns]")
+            present = np.zeros(rows, dtype=bool)
+        # 日付が書かれているのに読めなかった行（期間の絞り込みでは除かれる）
+        self.unparsed_dates = int((present & np.isnat(dates)).sum())
+        self.missing_dates = rows - int((~np.isnat(dates)).sum())
+        valid = np.flatnonzero(~np.isnat(dates))
+        self.date_order = valid[np.argsort(dates[valid], kind="stable")]
+        self.sorted_dates = dates[self.date_order]
+
+        # 顧客の索引
+        if self.customer_field in frame.columns:
+            codes, names = pd.factorize(frame[self.customer_field].fillna("").astype(str))
+        else:
+            codes, names = np.zeros(rows, dtype=np.int64), pd.Index([""])
+        self.customer_codes = codes
+        self.customer_keys = [_normalize(name) for name in names]
+
+        # 案件名（部分一致用）
+        if self.title_field in frame.columns:
+            self.titles = frame[self.title_field].fillna("").map(_normalize).to_numpy(object)
+        else:
+            self.titles = None
+
+        # 数値の列（amount_fields と、値がすべて数値に変換できる列）と降順の並び
+        self.numbers = {}
+        self.orders = {}
+        for column in frame.columns:
+            values = _to_number(frame[column]).to_numpy(float)
+            present = frame[column].notna().to_numpy()
+            if column not in self.amount_fields and (not present.any() or np.isnan(values[present]).any()):
+                continue
+            self.numbers[column] = values
+            self.orders[column] = np.argsort(np.where(np.isnan(values), np.inf, -values), kind="stable")
+
+    # 条件に合う行の真偽値配列
+    def mask(self, date_from=None, date_to=None, customer=None, keyword=None):
+        mask = np.ones(len(self.frame), dtype=bool)
+        if date_from or date_to:
+            lo = 0
+            hi = len(self.sorted_dates)
+            if date_from:
+                lo = np.searchsorted(self.sorted_dates, np.datetime64(pd.Timestamp(date_from)), "left")
+            if date_to:
+                # 日付だけの指定はその日の終わりまで含める
+                end = pd.Timestamp(date_to)
+                if len(str(date_to)) <= 10:
+                    end += pd.Timedelta(days=1)
+                    hi = np.searchsorted(self.sorted_dates, np.datetime64(end), "left")
+                else:
+                    hi = np.searchsorted(self.sorted_dates, np.datetime64(end), "right")
+            in_range = np.zeros(len(self.frame), dtype=bool)
+            in_range[self.date_order[lo:hi]] = True
+            mask &= in_range
+        if customer:
+            key = _normalize(customer)
+            matched = [code for code, name in enumerate(self.customer_keys) if key in name]
+            mask &= np.isin(self.customer_codes, matched)
+        if keyword and self.titles is not None:
+            key = _normalize(keyword)
+            mask &= np.fromiter((key in title for title in self.titles), dtype=bool, count=len(self.titles))
+        return mask
+
+    # 集計の実行。operation は "top" / "sum" / "avg" / "count"。
+    def query(self, operation, field=None, date_from=None, date_to=None,
+              customer=None, keyword=None, top_k=5):
+        if operation not in OPERATIONS:
+            raise ValueError(f"operation は {', '.join(OPERATIONS)} のいずれかです: {operation}")
+        if operation != "count" and field not in self.numbers:
+            raise ValueError(f"数値の項目ではありません: {field}（使える項目: {', '.join(self.numbers)}）")
+
+        mask = self.mask(date_from, date_to, customer, keyword)
+        result = {
+            "operation": operation,
+            "field": field,
+            "conditions": {"date_from": date_from, "date_to": date_to,
+                           "customer": customer, "keyword": keyword},
+            "matched": int(mask.sum()),
+        }
+        if (date_from or date_to) and self.missing_dates:
+            # 日付がない・読めない行は期間の条件に合うか分からないので、結果から外れている
+            result["rows_without_date"] = self.missing_dates
+            result["rows_with_unparsed_date"] = self.unparsed_dates
+        if operation == "count":
+            result["value"] = result["matched"]
+            return result
+
+        values = self.numbers[field]
+        used = mask & ~np.isnan(values)
+        result["rows_with_value"] = int(used.sum())
+        if operation == "sum":
+            result["value"] = float(values[used].sum())
+        elif operation == "avg":
+            result["value"] = float(values[used].mean()) if used.any() else None
+        else:
+            order = self.orders[field]
+            picked = order[used[order]][:max(0, int(top_k))]
+            records = self.frame.iloc[picked].to_dict("records")
+            result["value"] = json.loads(json.dumps(records, ensure_ascii=False, default=str))
+        return result
+
+#======================================================================
+# キャッシュ付きの読み込み
+# JSON のサイズ・更新日時と項目の設定が同じなら、保存済みの EstimateTable を使う。
+def cache_path(path):
+    path = Path(path)
+    return path.with_name(path.name + ".estimates.pkl")
+
+def load_estimate_table(path, date_field="日付", customer_field="顧客名",
+                        title_field="案件名", amount_fields=()):
+    stat = os.stat(path)
+    key = {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+           "fields": [date_field, customer_field, title_field, list(amount_fields)]}
+    try:
+        with open(cache_path(path), "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("key") == key:
+            return cached["table"]
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        pass
+
+    table = EstimateTable(load_records(path), date_field, customer_field, title_field, amount_fields)
+    tmp_path = cache_path(path).with_name(cache_path(path).name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"key": key, "table": table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path(path))
+    return table
+
+# config.ini の [estimates] の項目名（load_estimate_table の引数）
+# エージェントと CLI で同じ項目名を使うので、キャッシュを互いに上書きしない。
+def estimate_fields(config):
+    section = config['estimates'] if config.has_section('estimates') else {}
+    amount_fields = [f.strip() for f in section.get('amount_fields', '').split(",") if f.strip()]
+    return {"date_field": section.get('date_field', '日付'),
+            "customer_field": section.get('customer_field', '顧客名'),
+            "title_field": section.get('title_field', '案件名'),
+            "amount_fields": amount_fields}
+
+# config.ini の [estimates] に従って読み込む
+def load_estimate_table_from_config(config, base_dir, path=None):
+    section = config['estimates'] if config.has_section('estimates') else {}
+    path = path or Path(base_dir) / section.get('path', 'estimate_data.json')
+    return load_estimate_table(path, **estimate_fields(config))
+
+# 実行例
+#   python estimate_query.py estimate_data.json top --field 粗利額 --from 2024-01-01 --to 2024-12-31 -k 5
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument("--field", default=None)
+    parser.add_argument("--from", dest="date_from", default=None)
+    parser.add_argument("--to", dest="date_to", default=None)
+    parser.add_argument("--customer", default=None)
+    parser.add_argument("--keyword", default=None)
+    parser.add_argument("-k", "--top-k", type=int, default=5)
+    parser.add_argument("--config", default=None,
+                        help="項目名を読む設定ファイル（省略時はこのスクリプトと同じフォルダの config.ini）")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config_path = args.config or Path(__file__).resolve().parent / "config.ini"
+    if Path(config_path).exists():
+        with open(config_path, "r", encoding="utf-8") as f:
+            config.read_file(f)
+    table = load_estimate_table_from_config(config, Path.cwd(), args.path)
+    result = table.query(args.operation, args.field, args.date_from, args.date_to,
+                         args.customer, args.keyword, args.top_k)
+    result["today"] = date.today().isoformat()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
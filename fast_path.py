@@ -0,0 +1,166 @@
+import re
+import unicodedata
+
+# API を呼ばずに訳せる段落の変換（規則ベース。同じ入力には常に同じ結果を返す）
+#   ・日本語（かな・漢字）を含まない段落は、全角英数字を半角にしてそのまま使う（"12.3%", "FY2024" など）
+#   ・日英対照表と完全に一致する段落は、対照表の英語表現を使う
+#   ・数値と単位: "△1,234百万円" → "-1,234 million yen", "12.5％" → "12.5%", "1人" → "1 person"
+#   ・単位の見出し: "（単位：百万円）" → "(Millions of yen)"
+#   ・日付・期間: "2025年3月31日" → "March 31, 2025", "2025年3月期" → "FY2025/3",
+#     "2025年3月期 第1四半期" → "Q1 FY2025/3", "2024年度" → "FY2024"（令和・平成・昭和も西暦にする）
+# どの規則にも当てはまらない段落だけを API で翻訳する。規則ごとの件数を集計し、命中率を表示する。
+
+# 日本語の文字（ひらがな・カタカナ・漢字・半角カナ・々〆）
+JAPANESE = re.compile(r"[぀-ヿ㐀-䶿一-鿿ｦ-ﾟ々〆]")
+
+# 単位 → 英語（"%" 以外は数値との間に空白を入れる）
+UNITS = {
+    "": "", "%": "%", "％": "%",
+    "円": "yen", "千円": "thousand yen", "百万円": "million yen", "億円": "hundred million yen",
+    "株": "shares", "千株": "thousand shares", "名": "persons", "人": "persons",
+    "社": "companies", "件": "cases", "倍": "times", "ポイント": "pt", "pt": "pt",
+    "ヶ月": "months", "か月": "months", "カ月": "months",
+}
+# 数値が 1 の時に使う単数形
+SINGULAR_UNITS = {
+    "shares": "share", "persons": "person", "companies": "company", "cases": "case",
+    "times": "time", "months": "month",
+}
+UNIT_HEADERS = {
+    "円": "Yen", "千円": "Thousands of yen", "百万円": "Millions of yen", "億円": "Hundreds of millions of yen",
+    "株": "Shares", "千株": "Thousands of shares", "%": "%",
+}
+# 負の数を表す記号（決算書の △・▲）
+NEGATIVE_SIGNS = "△▲▽-−"
+
+NUMBER = r"(?P<sign>[△▲▽\-−+]?)(?P<number>\d{1,3}(?:,\d{3})+|\d+)(?P<fraction>\.\d+)?"
+NUMBER_WITH_UNIT = re.compile(NUMBER + r"\s*(?P<unit>" + "|".join(
+    re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True) if unit) + r")?")
+YEN_SEN = re.compile(r"(?P<sign>[△▲▽\-−]?)(?P<yen>[\d,]+)\s*円\s*(?P<sen>\d{1,2})\s*銭")
+UNIT_HEADER = re.compile(r"[(（\[]?単位[:：]\s*(?P<unit>[^)）\]]+?)\s*[)）\]]?")
+
+ERAS = {"令和": 2018, "平成": 1988, "昭和": 1925}
+ERA_YEAR = re.compile(r"(?P<era>令和|平成|昭和)\s*(?P<year>\d{1,2}|元)年")
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+FISCAL_PERIOD = re.compile(r"(?P<year>\d{4})年(?P<month>\d{1,2})月期"
+                           r"(?:\s*第(?P<quarter>[1-4])四半期(?P<cumulative>累計)?)?")
+QUARTER = re.compile(r"第(?P<quarter>[1-4])四半期")
+FISCAL_YEAR = re.compile(r"(?P<year>\d{4})年度")
+FULL_DATE = re.compile(r"(?P<year>\d{4})年(?P<month>\d{1,2})月(?P<day>\d{1,2})日")
+YEAR_MONTH = re.compile(r"(?P<year>\d{4})年(?P<month>\d{1,2})月")
+YEAR = re.compile(r"(?P<year>\d{4})年")
+
+#======================================================================
+# 照合用の正規化（全角英数字・記号を半角にし、前後の空白を除く）
+# △・▲ は NFKC でも変わらない。
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).strip()
+
+def has_japanese(text):
+    return JAPANESE.search(text) is not None
+
+# 和暦の年を西暦にする（"令和7年" → "2025年"）
+def _western_years(text):
+    def replace(match):
+        year = 1 if match["year"] == "元" else int(match["year"])
+        return f"{ERAS[match['era']] + year}年"
+    return ERA_YEAR.sub(replace, text)
+
+def _valid_month(month):
+    return 1 <= int(month) <= 12
+
+#======================================================================
+# 規則ごとの変換。当てはまらなければ None を返す。
+def convert_number(text):
+    match = YEN_SEN.fullmatch(text)
+    if match:
+        sign = "-" if match["sign"] else ""
+        return f"{sign}{match['yen']}.{int(match['sen']):02d} yen"
+    match = NUMBER_WITH_UNIT.fullmatch(text)
+    if match:
+        sign = "-" if match["sign"] and match["sign"] in NEGATIVE_SIGNS else match["sign"]
+        unit = UNITS[match["unit"] or ""]
+        if match["number"] == "1" and not match["fraction"]:
+            unit = SINGULAR_UNITS.get(unit, unit)
+        value = f"{sign}{match['number']}{match['fraction'] or ''}"
+        return value + unit if unit in ("", "%") else f"{value} {unit}"
+    match = UNIT_HEADER.fullmatch(text)
+    if match and match["unit"] in UNIT_HEADERS:
+        return f"({UNIT_HEADERS[match['unit']]})"
+    return None
+
+def convert_period(text):
+    text = _western_years(text)
+    match = FISCAL_PERIOD.fullmatch(text)
+    if match and _valid_month(match["month"]):
+        period = f"FY{match['year']}/{int(match['month'])}"
+        if match["quarter"]:
+            cumulative = " cumulative" if match["cumulative"] else ""
+            return f"Q{match['quarter']}{cumulative} {period}"
+        return period
+    match = QUARTER.fullmatch(text)
+    if match:
+        return f"Q{match['quarter']}"
+    match = FISCAL_YEAR.fullmatch(text)
+    if match:
+        return f"FY{match['year']}"
+    match = FULL_DATE.fullmatch(text)
+    if match and _valid_month(match["month"]) and 1 <= int(match["day"]) <= 31:
+        return f"{MONTHS[int(match['month']) - 1]} {int(match['day'])}, {match['year']}"
+    match = YEAR_MONTH.fullmatch(text)
+    if match and _valid_month(match["month"]):
+        return f"{MONTHS[int(match['month']) - 1]} {match['year']}"
+    match = YEAR.fullmatch(text)
+    if match:
+        return match["year"]
+    return None
+
+#======================================================================
+class FastPath:
+    RULES = ("number", "no_japanese", "glossary", "period")
+
+    # vocab は日英対照表 {日本語: 英語}（glossary.load_glossary）。None なら完全一致の照合はしない。
+    def __init__(self, vocab=None, skip_non_japanese=True):
+        self.vocab = {normalize(str(jp)): str(en) for jp, en in (vocab or {}).items() if str(jp).strip()}
+        self.skip_non_japanese = skip_non_japanese
+        self.hits = dict.fromkeys(self.RULES, 0)
+        self.total = 0
+
+    # 規則で訳せれば (英語, 規則名)、訳せなければ (None, None) を返す
+    def match(self, text):
+        key = normalize(text)
+        if not key:
+            return None, None
+        # 数値は日本語を含まなくても変換する（"△12" → "-12"）
+        # 空白は数値と単位の間だけ認める（"2024 2025" のような複数の数値はつなげない）
+        translated = convert_number(key)
+        if translated is not None:
+            return translated, "number"
+        if not has_japanese(key):
+            return (key, "no_japanese") if self.skip_non_japanese else (None, None)
+        if key in self.vocab:
+            return self.vocab[key], "glossary"
+        translated = convert_period(key)
+        if translated is not None:
+            return translated, "period"
+        return None, None
+
+    # 段落1件を変換し、件数を集計する。訳せなければ None を返す。
+    def translate(self, text):
+        self.total += 1
+        translated, rule = self.match(text)
+        if rule:
+            self.hits[rule] += 1
+        return translated
+
+    def stats(self):
+        hits = sum(self.hits.values())
+        return {"segments": self.total, "hits": hits,
+                "hit_rate": round(hits / self.total, 4) if self.total else 0.0, **self.hits}
+
+    def report(self):
+        stats = self.stats()
+        detail = " / ".join(f"{rule} {self.hits[rule]}" for rule in self.RULES)
+        return (f"ローカル変換: {stats['hits']} / {stats['segments']} 段落 "
+                f"（{stats['hit_rate']:.1%}） [{detail}]")
@@ -1,72 +1,52 @@
 from dotenv import load_dotenv
 import os
 from openai import OpenAI
-import pandas as pd
-import io, json
 import configparser
 from pathlib import Path
+from glossary import load_glossary
+from ft_dataset import build_dataset, estimate_training_cost
+from ft_monitor import run_watch_jobs
+import telemetry
 
-#======================================================================
-# Excelファイルから日本語に対する英語表現のを取得
-# Excelには「日本語」列と「英語」列があり、行ごとに対応する表現が記入されている。
-def load_custom_vocab_from_excel(filename):
-    df = pd.read_excel(filename)
-    df = df[['日本語', '英語']].dropna()
-    return dict(zip(df['日本語'], df['英語']))
+# ファインチューニングの元になるモデル
+FT_BASE_MODEL = "gpt-3.5-turbo-0125"
+# ファインチューニングのハイパーパラメータ（学習費用の見積もりにも使う）
+HYPERPARAMETERS = {
+    "n_epochs": 3,
+    "batch_size": "auto",
+    "learning_rate_multiplier": 0.1
+}
 
 #======================================================================
-# 日英対照表の情報から、日本語と英語をペアにしたリストを作成
+# 日英対照表の情報から、(日本語, 英語) の順のペアを作成
+# 正規化・重複除去は ft_dataset.build_dataset で行う。
 def create_vocab_instructions(vocab_dict):
-    pairs = []
     for jp, en in vocab_dict.items():
-        line = {jp, en}
-        pairs.append(line)
-    return pairs
+        yield jp, en
 
 #======================================================================
 # ChatGPTモデルのファインチューニング実行
+# 学習データ（と検証データ）のファイルをアップロードしてジョブを作成する。
 # 必要に応じて、モデルの設定を変更する必要あり
-def finetuning_gpt(client, prompt_completion_pairs):
-    # 学習データ生成
-    lines = []
-    for jp, en in prompt_completion_pairs:
-        lines.append(json.dumps({
-            "messages":[
-                {"role":"user", "content": jp},
-                {"role":"assistant", "content": en}
-            ]
-        }, ensure_ascii=False))
-    body = "\n".join(lines) + "\n"
-    buffer = io.BytesIO(body.encode("utf-8"))
-    buffer.name = "vocab_chat.jsonl"
+def finetuning_gpt(client, training_path, validation_path=None):
+    with open(training_path, "rb") as f, telemetry.timed("files.create"):
+        training = client.files.create(file=f, purpose="fine-tune")
+    validation = None
+    if validation_path:
+        with open(validation_path, "rb") as f, telemetry.timed("files.create"):
+            validation = client.files.create(file=f, purpose="fine-tune")
 
     # ファインチューニング実施
-    upload = client.files.create(file=buffer, purpose="fine-tune")
-    job = client.fine_tuning.jobs.create(
-        training_file=upload.id,
-        model="gpt-3.5-turbo-0125",
-        hyperparameters={
-            "n_epochs": 3,
-            "batch_size": "auto",
-            "learning_rate_multiplier": 0.1
-        },
-        suffix="jp-en-finetune-v1"       
-    )
+    with telemetry.timed("fine_tuning.jobs.create", FT_BASE_MODEL):
+        job = client.fine_tuning.jobs.create(
+            training_file=training.id,
+            validation_file=validation.id if validation else None,
+            model=FT_BASE_MODEL,
+            hyperparameters=HYPERPARAMETERS,
+            suffix="jp-en-finetune-v1"       
+        )
     return job
 
-#======================================================================
-# ファインチューニング状況確認　30秒ごとに状態を表示する
-# モデルの生成はOpenAI diveloper's platform上で状況確認できるので、
-# この処理が終わる前に強制終了しても問題ない。
-def wait_for_ft_job(client, job_id, env_key):
-    import time
-    while True:
-        resp = client.fine_tuning.jobs.retrieve(job_id)
-        print("Status:(", env_key, ")", resp.status)
-        if resp.status in ("succeeded", "failed"):
-            return resp
-        time.sleep(30)
-
 # Example usage
 if __name__ == "__main__":
 
@@ -79,17 +59,42 @@ if __name__ == "__main__":
     with open(config_path, 'r', encoding='utf-8') as f:
         config.read_file(f)
 
+    # API 呼び出しの計測結果を [telemetry] dir の fine_tuning.jsonl / fine_tuning.prom に書き出す
+    telemetry.configure_from_config(config, BASE_DIR, "fine_tuning")
+
     vocab_excel = BASE_DIR / config['input']['glossary']
-    vocab_dict = load_custom_vocab_from_excel(vocab_excel)
+    vocab_dict = load_glossary(vocab_excel)
     vocab_pairs = create_vocab_instructions(vocab_dict)
 
+    # 学習データを作成・検証し、学習費用を見積もる（アップロード前）
+    ft_config = config['fine_tuning'] if config.has_section('fine_tuning') else {}
+    dataset = build_dataset(
+        vocab_pairs,
+        BASE_DIR / ft_config.get('dataset_dir', 'ft_data'),
+        validation_ratio=float(ft_config.get('validation_ratio', 0.1)),
+    )
+    stats = dataset["stats"]
+    billed_tokens, cost = estimate_training_cost(
+        stats["train"]["tokens"], HYPERPARAMETERS["n_epochs"],
+        float(ft_config.get('price_per_1k_tokens', 0.008)))
+    print(f"学習データ: {stats['train']['examples']} 件 ({stats['train']['tokens']} トークン) / "
+          f"検証データ: {stats['validation']['examples']} 件 ({stats['validation']['tokens']} トークン)")
+    print(f"学習トークン数（見積もり）: {billed_tokens} / 学習費用（見積もり）: ${cost:.2f}")
+
     env_key = "API_9519-01_TRY"
     client = OpenAI(api_key=os.getenv(env_key))
-    job = finetuning_gpt(client, vocab_pairs)
+    job = finetuning_gpt(client, dataset["paths"]["train"], dataset["paths"]["validation"])
     print(f"Fine-Tune Job ID: {job.id}; status: {job.status}")
     print("------------------")
 
-    resp = wait_for_ft_job(client, job.id, env_key)
+    # ファインチューニング状況確認（状態・学習指標を届いた順に表示する）
+    # モデルの生成はOpenAI diveloper's platform上で状況確認できるので、
+    # この処理が終わる前に強制終了しても問題ない。
+    # 途中から確認する時は python ft_monitor.py <ジョブID> ...
+    resp = run_watch_jobs(os.getenv(env_key), [job.id])[job.id]
+    if isinstance(resp, Exception):
+        raise resp
     ft_model = resp.fine_tuned_model
     print(f"Fine-Tune Model ID: {ft_model}")
     print("===  model is ready ====")
+    telemetry.finish()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+from pathlib import Path
+from token_utils import count_tokens
+from translation_cache import normalize_text
+
+# ファインチューニング用データセット（チャット形式の JSONL）の作成
+#   ・(日本語, 英語) の順序を保ったまま、正規化・重複除去して1件ずつファイルに書き出す
+#   ・日本語のハッシュで学習用と検証用に振り分ける（実行のたびに同じ分け方になる）
+#   ・全件をチャット形式として検証し、tiktoken でトークン数と学習費用を見積もる
+
+# OpenAI のファインチューニングで必要な最小件数
+MIN_EXAMPLES = 10
+# チャット形式で1メッセージあたりに加算されるトークン数（概算）
+TOKENS_PER_MESSAGE = 4
+VALID_ROLES = ("system", "user", "assistant")
+
+#======================================================================
+# (日本語, 英語) のペアを正規化し、空のもの・日本語が重複するものを除いて順に返す
+def iter_unique_pairs(pairs):
+    seen = set()
+    for jp, en in pairs:
+        jp = normalize_text(str(jp))
+        en = normalize_text(str(en))
+        if not jp or not en or jp in seen:
+            continue
+        seen.add(jp)
+        yield jp, en
+
+#======================================================================
+# 1件分の学習データ（チャット形式）を作る
+def make_example(jp, en):
+    return {
+        "messages": [
+            {"role":"user", "content": jp},
+            {"role":"assistant", "content": en}
+        ]
+    }
+
+#======================================================================
+# チャット形式のファインチューニングデータとして正しいかを確認する
+# 問題があれば ValueError を送出する。
+def validate_example(example):
+    messages = example.get("messages") if isinstance(example, dict) else None
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("messages がありません")
+    for message in messages:
+        if not isinstance(message, dict) or message.get("role") not in VALID_ROLES:
+            raise ValueError(f"role が不正です: {message}")
+        content = message.get("content")
+        if not isinstance(content, str) or not content.strip():
+            raise ValueError(f"content が空です: {message}")
+    if messages[-1]["role"] != "assistant":
+        raise ValueError("最後のメッセージが assistant ではありません")
+
+def count_example_tokens(example):
+    return sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in example["messages"])
+
+#======================================================================
+# 日本語のハッシュで検証用に振り分けるかを決める
+def _is_validation(jp, validation_ratio):
+    digest = hashlib.sha1(jp.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < validation_ratio
+
+#======================================================================
+# データセットを out_dir に書き出し、ファイルのパスと件数・トークン数を返す
+# chunk_size 件ずつまとめて書き込むので、対照表が大きくてもメモリ使用量は一定。
+def build_dataset(pairs, out_dir, validation_ratio=0.1, chunk_size=1000):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"train": out_dir / "vocab_chat_train.jsonl",
+             "validation": out_dir / "vocab_chat_validation.jsonl"}
+    stats = {name: {"examples": 0, "tokens": 0} for name in paths}
+    files = {name: open(path, "w", encoding="utf-8") for name, path in paths.items()}
+    buffers = {name: [] for name in paths}
+    try:
+        for line_no, (jp, en) in enumerate(iter_unique_pairs(pairs), 1):
+            example = make_example(jp, en)
+            try:
+                validate_example(example)
+            except ValueError as e:
+                raise ValueError(f"{line_no} 件目 ({jp}): {e}") from None
+            name = "validation" if _is_validation(jp, validation_ratio) else "train"
+            buffers[name].append(json.dumps(example, ensure_ascii=False) + "\n")
+            stats[name]["examples"] += 1
+            stats[name]["tokens"] += count_example_tokens(example)
+            if len(buffers[name]) >= chunk_size:
+                files[name].writelines(buffers[name])
+                buffers[name].clear()
+        for name, buffer in buffers.items():
+            files[name].writelines(buffer)
+    finally:
+        for f in files.values():
+            f.close()
+
+    if stats["train"]["examples"] < MIN_EXAMPLES:
+        raise ValueError(f"学習データが {MIN_EXAMPLES} 件未満です ({stats['train']['examples']} 件)")
+    if stats["validation"]["examples"] == 0:
+        paths["validation"].unlink()
+        paths["validation"] = None
+    return {"paths": paths, "stats": stats}
+
+#======================================================================
+# 学習費用の見積もり（学習トークン数 × エポック数 × 1,000トークンあたりの単価）
+def estimate_training_cost(train_tokens, n_epochs, price_per_1k_tokens):
+    billed_tokens = train_tokens * n_epochs
+    return billed_tokens, billed_tokens / 1000 * price_per_1k_tokens
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from telemetry import timed
+
+# ファインチューニングジョブの監視（複数ジョブを同時に）
+#   ・ジョブごとにイベントを差分だけ取得する（前回までに見たイベントの ID を覚えておく）
+#   ・新しいイベントがあれば短い間隔で、動きがなければ徐々に間隔を延ばして問い合わせる
+#   ・状態の変化・学習指標（step, loss）・メッセージを、届いた順に辞書で通知する
+# client は AsyncOpenAI と同じ形（fine_tuning.jobs.retrieve / list_events）であればよいので、
+# ローカルの代替サーバー（mock_openai_server.py を --base-url に指定）や代替オブジェクトでも動かせる。
+
+# ジョブの終了状態
+FT_DONE_STATUSES = ("succeeded", "failed", "cancelled")
+
+#======================================================================
+# 前回見たイベント（last_event_id）より新しいイベントを古い順に返す
+# list_events は新しい順に返し、after（前のページの最後の ID）は古い方へ進むためのカーソルなので、
+# 新しいイベントだけを直接は取れない。既知のイベントに行き当たるまでページをたどる。
+# 2回目以降は2件（新着1件と既知の1件）から始めてページごとに倍にする。毎回 page_size 件を取り直さず、
+# 取得する件数は多くても新着の約2倍で済む。
+async def fetch_new_events(client, job_id, last_event_id=None, page_size=100):
+    events = []
+    after = None
+    limit = 2 if last_event_id else page_size
+    while True:
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+        with timed("fine_tuning.jobs.list_events"):
+            page = await client.fine_tuning.jobs.list_events(job_id, **params)
+        for event in page.data:
+            if event.id == last_event_id:
+                return events[::-1]
+            events.append(event)
+        if not page.data or not page.has_more:
+            return events[::-1]
+        after = page.data[-1].id
+        limit = min(page_size, limit * 2)
+
+#======================================================================
+# イベントを通知用の辞書にする
+def event_update(job_id, event):
+    update = {"job": job_id, "time": event.created_at}
+    data = getattr(event, "data", None) or {}
+    if getattr(event, "type", None) == "metrics":
+        update["kind"] = "metrics"
+        update.update({key: value for key, value in data.items()
+                       if key in ("step", "total_steps", "train_loss", "valid_loss",
+                                  "train_mean_token_accuracy", "valid_mean_token_accuracy")})
+    else:
+        update.update(kind="message", level=event.level, message=event.message)
+    return update
+
+def print_update(update):
+    print(json.dumps(update, ensure_ascii=False), flush=True)
+
+#======================================================================
+# 1つのジョブを終了まで監視し、最後のジョブ情報を返す
+# 問い合わせ間隔は min_interval から始め、変化がない間は backoff 倍ずつ max_interval まで延ばす。
+async def watch_job(client, job_id, on_update=print_update,
+                    min_interval=2.0, max_interval=60.0, backoff=1.5):
+    last_event_id = None
+    status = None
+    interval = min_interval
+    while True:
+        with timed("fine_tuning.jobs.retrieve"):
+            job = await client.fine_tuning.jobs.retrieve(job_id)
+        events = await fetch_new_events(client, job_id, last_event_id)
+        for event in events:
+            on_update(event_update(job_id, event))
+        if events:
+            last_event_id = events[-1].id
+
+        changed = job.status != status
+        if changed:
+            status = job.status
+            update = {"job": job_id, "kind": "status", "status": status, "time": int(time.time())}
+            if status == "succeeded":
+                update["fine_tuned_model"] = job.fine_tuned_model
+            if status == "failed" and getattr(job, "error", None):
+                update["error"] = getattr(job.error, "message", str(job.error))
+            on_update(update)
+        if status in FT_DONE_STATUSES:
+            return job
+
+        interval = min_interval if (events or changed) else min(max_interval, interval * backoff)
+        await asyncio.sleep(interval)
+
+#======================================================================
+# 複数のジョブを同時に監視し、{ジョブID: 最後のジョブ情報} を返す
+# 監視中に例外が起きたジョブは、ジョブ情報の代わりに例外オブジェクトを入れる。
+async def watch_jobs(client, job_ids, on_update=print_update, **kwargs):
+    results = await asyncio.gather(*(watch_job(client, job_id, on_update, **kwargs)
+                                     for job_id in job_ids), return_exceptions=True)
+    return dict(zip(job_ids, results))
+
+#======================================================================
+# 同期コードから呼び出すための入口
+def run_watch_jobs(api_key, job_ids, base_url=None, **kwargs):
+    async def _main():
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        try:
+            return await watch_jobs(client, job_ids, **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(_main())
+
+# 実行例
+#   python ft_monitor.py ftjob-abc ftjob-def
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("job_ids", nargs="+")
+    parser.add_argument("--min-interval", type=float, default=2.0)
+    parser.add_argument("--max-interval", type=float, default=60.0)
+    parser.add_argument("--base-url", default=None, help="API の接続先（ローカルの代替サーバー等）")
+    args = parser.parse_args()
+
+    load_dotenv()
+    env_key = "API_9519-01_TRY"
+    jobs = run_watch_jobs(os.getenv(env_key), args.job_ids, args.base_url,
+                          min_interval=args.min_interval, max_interval=args.max_interval)
+    for job_id, job in jobs.items():
+        if isinstance(job, Exception):
+            print(f"{job_id}: エラー {job}")
+        else:
+            print(f"{job_id}: {job.status} {job.fine_tuned_model or ''}")
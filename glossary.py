@@ -0,0 +1,200 @@
+from collections import deque
+import gc
+import hashlib
+import marshal
+import os
+import sys
+import unicodedata
+from pathlib import Path
+
+# コンパイル済み日英対照表の形式のバージョン（形式を変えたら上げる）
+COMPILED_VERSION = 1
+
+#======================================================================
+# Excelファイルから日本語に対する英語表現のを取得
+# Excelには「日本語」列と「英語」列があり、行ごとに対応する表現が記入されている。
+# pandas は読み込みに時間がかかるため、Excel を読む時だけ import する。
+def load_custom_vocab_from_excel(filename):
+    import pandas as pd
+    df = pd.read_excel(filename)
+    df = df[['日本語', '英語']].dropna()
+    return dict(zip(df['日本語'], df['英語']))
+
+#======================================================================
+# 用語照合用の正規化（全角/半角の揺れを吸収する。文字数は変えない）
+def _normalize(text):
+    return "".join(unicodedata.normalize("NFKC", ch)[:1] or ch for ch in text)
+
+#======================================================================
+# 日英対照表の全用語をまとめて照合する Aho-Corasick オートマトン
+# 一度だけ構築すれば、段落の長さに比例する時間で含まれる用語をすべて見つけられる。
+class GlossaryMatcher:
+    def __init__(self, vocab_dict):
+        self.terms = [(str(jp), str(en)) for jp, en in vocab_dict.items() if str(jp).strip()]
+        self._build()
+
+    # コンパイル済みの表（tables() の戻り値）から、構築し直さずに作る
+    @classmethod
+    def from_tables(cls, tables):
+        matcher = cls.__new__(cls)
+        matcher.terms = [tuple(term) for term in tables["terms"]]
+        matcher.goto = tables["goto"]
+        matcher.fail = tables["fail"]
+        matcher.output = tables["output"]
+        return matcher
+
+    def tables(self):
+        return {"terms": self.terms, "goto": self.goto, "fail": self.fail, "output": self.output}
+
+    def _build(self):
+        self.goto = [{}]
+        self.fail = [0]
+        # 出力（その節点で終わる用語の番号）は、用語のある節点だけを辞書で持つ
+        self.output = {}
+        for index, (jp, _) in enumerate(self.terms):
+            node = 0
+            for ch in _normalize(jp):
+                next_node = self.goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][ch] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                node = next_node
+            self.output.setdefault(node, []).append(index)
+
+        # 幅優先で失敗遷移を作り、失敗先の出力を引き継ぐ
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                inherited = self.output.get(self.fail[child])
+                if inherited:
+                    self.output[child] = self.output.get(child, []) + inherited
+
+    # text に含まれる用語を [(日本語, 英語), ...] で返す
+    # 重なる用語は、先に始まるもの・長いものを優先する（「売上」より「売上高」）。
+    def find_terms(self, text):
+        matches = []
+        node = 0
+        for end, ch in enumerate(_normalize(text), 1):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for index in self.output.get(node, ()):
+                matches.append((end - len(self.terms[index][0]), end, index))
+
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        found = []
+        seen = set()
+        position = 0
+        for start, end, index in matches:
+            if start < position or index in seen:
+                continue
+            seen.add(index)
+            found.append(self.terms[index])
+            position = end
+        return found
+
+    # 段落に含まれる用語の対訳だけをシステムプロンプトに追加する
+    def system_prompt(self, text, base_prompt):
+        terms = self.find_terms(text)
+        if not terms:
+            return base_prompt
+        lines = "\n".join(f"- {jp} → {en}" for jp, en in terms)
+        return f"{base_prompt}\nUse these glossary translations:\n{lines}"
+
+    # 翻訳結果に、原文の用語に対応する英語表現が含まれていないものを返す
+    def missing_terms(self, text, translated):
+        lowered = translated.lower()
+        return [(jp, en) for jp, en in self.find_terms(text) if en.lower() not in lowered]
+
+#======================================================================
+# コンパイル済み日英対照表（marshal 形式）
+# Excel を pandas で読むのは遅いため、対訳とオートマトンを「<Excel名>.glossary」に保存しておき、
+# 次回からはそちらを読む。Excel のサイズ・更新日時が変わった時は内容のハッシュを確かめ、
+# 内容が変わっていれば作り直す。
+# 対訳とオートマトンはそれぞれ marshal したバイト列で持ち、必要な方だけを展開する。
+
+def compiled_path(path):
+    path = Path(path)
+    return path.with_name(path.name + ".glossary")
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_compiled(path):
+    try:
+        with open(compiled_path(path), "rb") as f:
+            data = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != COMPILED_VERSION:
+        return None
+    return data
+
+def _write_compiled(path, data):
+    target = compiled_path(path)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        marshal.dump(data, f)
+    os.replace(tmp_path, target)
+
+#======================================================================
+# 日英対照表を読み込む（コンパイル済みが最新ならそれを使い、古ければ Excel から作り直す）
+def load_compiled_glossary(path):
+    stat = os.stat(path)
+    data = _read_compiled(path)
+    if data and data["size"] == stat.st_size and data["mtime_ns"] == stat.st_mtime_ns:
+        return data
+
+    sha256 = _file_sha256(path)
+    if data and data["sha256"] == sha256:
+        # 内容は同じで更新日時だけ変わった場合
+        data.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    else:
+        vocab = {str(jp): str(en) for jp, en in load_custom_vocab_from_excel(path).items()}
+        data = {
+            "version": COMPILED_VERSION,
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "vocab": marshal.dumps(vocab),
+            "matcher": marshal.dumps(GlossaryMatcher(vocab).tables()),
+        }
+    _write_compiled(path, data)
+    return data
+
+# 小さなオブジェクトを大量に作るため、展開中は GC を止める
+def _unmarshal(data):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return marshal.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+# 日英対照表を {日本語: 英語} で返す
+def load_glossary(path):
+    return _unmarshal(load_compiled_glossary(path)["vocab"])
+
+# 日英対照表の GlossaryMatcher を返す
+def load_glossary_matcher(path):
+    return GlossaryMatcher.from_tables(_unmarshal(load_compiled_glossary(path)["matcher"]))
+
+# 日英対照表を事前にコンパイルする
+#   python glossary.py 日英対照表.xlsx
+if __name__ == "__main__":
+    for excel_path in sys.argv[1:]:
+        data = load_compiled_glossary(excel_path)
+        print(f"{compiled_path(excel_path)}: {len(_unmarshal(data['vocab']))} 語")
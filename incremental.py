@@ -0,0 +1,48 @@
+from difflib import SequenceMatcher
+from docx_stream import extract_paragraphs
+from translation_cache import normalize_text
+
+# 改訂版の文書を差分だけ翻訳するための処理
+# 前版の原文と前版の翻訳結果（output_*.docx）を段落 ID で対応付け、
+# 新しい原文と段落単位で突き合わせて、変わっていない段落の翻訳を再利用する。
+
+#======================================================================
+# 前版の原文・翻訳結果から、[(原文, 翻訳), ...] を文書順に作る
+# 翻訳結果が原文のまま（翻訳エラーなど）の段落は除く。
+def load_previous_pairs(prev_source_path, prev_translated_path):
+    translated = dict(extract_paragraphs(prev_translated_path))
+    pairs = []
+    for pid, text in extract_paragraphs(prev_source_path):
+        translation = translated.get(pid)
+        if translation and translation != text:
+            pairs.append((text, translation))
+    return pairs
+
+#======================================================================
+# 前版の (原文, 翻訳) と新しい原文のリストを突き合わせる
+# 戻り値は {新しい原文の添字: 再利用する翻訳} と、件数の内訳。
+#   unchanged : 前後の並びも含めて一致した段落
+#   moved     : 並びは違うが、同じ原文が前版にあった段落
+#   changed   : 追加・変更された段落（翻訳が必要）
+def align_with_previous(pairs, new_texts):
+    old_keys = [normalize_text(source) for source, _ in pairs]
+    new_keys = [normalize_text(text) for text in new_texts]
+    reuse = {}
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for k in range(i2 - i1):
+                reuse[j1 + k] = pairs[i1 + k][1]
+    unchanged = len(reuse)
+
+    by_key = {key: translation for key, (_, translation) in zip(old_keys, pairs)}
+    for j, key in enumerate(new_keys):
+        if j not in reuse and key in by_key:
+            reuse[j] = by_key[key]
+
+    stats = {
+        "unchanged": unchanged,
+        "moved": len(reuse) - unchanged,
+        "changed": len(new_texts) - len(reuse),
+    }
+    return reuse, stats
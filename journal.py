@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+#======================================================================
+# ファイル内容の SHA-256 を返す（大きなファイルも分割して読む）
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+#======================================================================
+# 翻訳ジョブのジャーナル（追記専用の JSONL）
+# 翻訳が終わった段落を1行ずつ記録し、すぐにディスクへ書き出す。
+# 途中で止まった時は resume=True で開くと、記録済みの翻訳を読み戻して続きから再開できる。
+# 1行の形式: {"doc": 入力文書のハッシュ, "model": モデルID, "pid": 段落ID, "src": 原文のハッシュ, "text": 翻訳}
+class TranslationJournal:
+    def __init__(self, path, doc_hash, modelID, resume=False):
+        self.path = Path(path)
+        self.doc_hash = doc_hash
+        self.modelID = modelID
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done = self._replay() if resume else {}
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    # 記録済みの翻訳を {段落ID: (原文のハッシュ, 翻訳)} で読み込む
+    # 書き込み途中で止まった最後の行などの壊れた行は読み飛ばす。
+    def _replay(self):
+        done = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("doc") == self.doc_hash and record.get("model") == self.modelID:
+                    done[record["pid"]] = (record["src"], record["text"])
+        return done
+
+    # 段落 pid の原文が text の時、記録済みの翻訳を返す（無ければ None）
+    def lookup(self, pid, text):
+        entry = self.done.get(pid)
+        if entry is None or entry[0] != _text_hash(text):
+            return None
+        return entry[1]
+
+    def record(self, pid, text, translated):
+        self.file.write(json.dumps({
+            "doc": self.doc_hash,
+            "model": self.modelID,
+            "pid": pid,
+            "src": _text_hash(text),
+            "text": translated
+        }, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    # 全段落の翻訳が終わり、出力を保存できた後に呼ぶ
+    def remove(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,540 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ベンチマーク・動作確認用の OpenAI 互換ローカルサーバー
+#   ・応答までの遅延（latency + 0〜jitter 秒）を設定できる
+#   ・error_rate の割合で 500 を返す
+#   ・rpm / tpm（0 で無制限）を超えると、retry-after 付きの 429 を返す
+#   ・応答には x-ratelimit-* ヘッダーを付ける（RateLimiter の動作確認用）
+#   ・tools の指定があれば、最初は全ツールを呼び出す tool_calls を返し、ツールの結果を受け取ったら回答する
+#   ・stream=true の時は SSE で少しずつ返す（最初の断片までが latency、以降 stream_interval 秒ごと）
+# 翻訳結果は "[EN] 原文" を返す。まとめ翻訳（JSON モード）の形式にも対応する。
+# 実際の API 料金をかけずに、翻訳処理の速さを測るために使う。
+# Batch API（batch_translate.py）とファインチューニングの監視（ft_monitor.py）の確認用に、次も用意する。
+#   POST /v1/files, GET /v1/files/{id}/content
+#   POST /v1/batches, GET /v1/batches/{id}
+#     バッチは batch_polls 回目の取得で完了し、各リクエストに chat/completions と同じ応答を返す
+#   POST /v1/fine_tuning/jobs, GET /v1/fine_tuning/jobs/{id}, GET /v1/fine_tuning/jobs/{id}/events
+#     ジョブは取得のたびに1段階進み（検証 → 開始 → ft_steps 回の学習ステップ → 完了）、段階ごとにイベントを残す
+#     イベントは本物の API と同じく新しい順に返し、after には前のページの最後のイベント ID を指定する
+# 遅延・エラー・レート上限は chat/completions にだけ適用する。
+
+#======================================================================
+# トークン数の概算（tiktoken を使わずに済むよう、文字数から見積もる）
+def estimate_tokens(text):
+    return max(1, len(text) // 2)
+
+def pseudo_translate(text):
+    return f"[EN] {text}"
+
+# ストリーミングで返す断片の文字数
+STREAM_CHUNK_CHARS = 8
+
+# JSON スキーマに合う値（文字列は enum の先頭か "mock"）
+def schema_example(schema):
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object" or "properties" in schema:
+        return {name: schema_example(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return "mock"
+
+#======================================================================
+# リクエスト内容から応答メッセージを作る
+# 構造化出力（json_schema）にはスキーマに合う値を返す（エージェントの動作確認用）。
+def make_reply(body):
+    messages = body.get("messages") or [{"content": ""}]
+    results = []
+    for message in reversed(messages):
+        if message.get("role") != "tool":
+            break
+        results.insert(0, message.get("content") or "")
+    if results:
+        return pseudo_translate(" / ".join(results))
+    content = messages[-1].get("content") or ""
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(schema_example(response_format["json_schema"].get("schema", {})),
+                          ensure_ascii=False)
+    if response_format.get("type") == "json_object":
+        try:
+            segments = json.loads(content)["segments"]
+            return json.dumps({"translations": [
+                {"id": item["id"], "text": pseudo_translate(item["text"])} for item in segments
+            ]}, ensure_ascii=False)
+        except (ValueError, KeyError, TypeError):
+            pass
+    return pseudo_translate(content)
+
+def chat_completion(body, content, prompt_tokens, completion_tokens, request_number):
+    return {
+        "id": f"chatcmpl-mock-{request_number}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or "mock",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+def prompt_token_count(body):
+    return sum(estimate_tokens(json.dumps(m.get("content") or "", ensure_ascii=False))
+               for m in body.get("messages", []))
+
+# multipart/form-data を {フィールド名: (ファイル名, 内容)} にする（ファイル名のないフィールドは None）
+def parse_multipart(content_type, data):
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + data)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+# "_" で始まる内部用の項目を除く
+def public(obj):
+    return {key: value for key, value in obj.items() if not key.startswith("_")}
+
+# ツール呼び出し（最後のメッセージがユーザーの時だけ、登録された全ツールを1回ずつ呼ぶ）
+def make_tool_calls(body, request_number):
+    messages = body.get("messages") or []
+    if not body.get("tools") or body.get("tool_choice") == "none" or not messages \
+            or messages[-1].get("role") != "user":
+        return None
+    return [{"id": f"call_mock_{request_number}_{i}", "type": "function",
+             "function": {"name": tool["function"]["name"],
+                          "arguments": json.dumps(schema_example(tool["function"].get("parameters", {})),
+                                                  ensure_ascii=False)}}
+            for i, tool in enumerate(body["tools"]) if tool.get("type") == "function"]
+
+#======================================================================
+class MockOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.0,
+                 error_rate=0.0, rpm=0, tpm=0, seed=0, stream_interval=0.01,
+                 batch_polls=1, ft_steps=5):
+        self.latency = latency
+        self.batch_polls = batch_polls
+        self.ft_steps = ft_steps
+        self.files = {}                # ファイルID → (メタデータ, 内容)
+        self.batches = {}              # バッチID → バッチ（取得回数は "_polls"）
+        self.ft_jobs = {}              # ジョブID → ジョブ（イベントは "_events"、古い順）
+        self.next_id = 0
+        self.stream_interval = stream_interval
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()          # 直近1分間の (時刻, トークン数)
+        self.reset()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # 集計をやり直す（ベンチマークのケースごとに呼ぶ）
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.rate_limited = 0
+            self.latencies = []
+            self.event_requests = 0
+            self.events_returned = 0
+            self.window.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors,
+                    "rate_limited": self.rate_limited, "latencies": list(self.latencies)}
+
+    # レート上限の判定。超えていれば再試行までの秒数、超えていなければ None を返す。
+    def _check_rate_limit(self, tokens):
+        now = time.monotonic()
+        while self.window and now - self.window[0][0] >= 60:
+            self.window.popleft()
+        used_requests = len(self.window)
+        used_tokens = sum(t for _, t in self.window)
+        if (self.rpm and used_requests + 1 > self.rpm) or (self.tpm and used_tokens + tokens > self.tpm):
+            return max(0.05, 60 - (now - self.window[0][0])) if self.window else 1.0
+        self.window.append((now, tokens))
+        return None
+
+    # 以下の _ で始まる処理は lock を取ってから呼ぶ
+    def _new_id(self, prefix):
+        self.next_id += 1
+        return f"{prefix}-mock{self.next_id}"
+
+    def _add_file(self, filename, purpose, content):
+        file_id = self._new_id("file")
+        meta = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename or "upload", "purpose": purpose, "status": "processed"}
+        self.files[file_id] = (meta, content)
+        return meta
+
+    # バッチの入力ファイルの各行に応答し、結果ファイルを作る
+    def _complete_batch(self, batch):
+        _, content = self.files[batch["input_file_id"]]
+        results = []
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request.get("body") or {}
+            reply = make_reply(body)
+            self.requests += 1
+            results.append({
+                "id": f"batch_req_mock{len(results)}", "custom_id": request.get("custom_id"), "error": None,
+                "response": {"status_code": 200, "request_id": f"req_mock{len(results)}",
+                             "body": chat_completion(body, reply, prompt_token_count(body),
+                                                     estimate_tokens(reply), self.requests)}})
+        output = "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+        now = int(time.time())
+        batch.update(status="completed", completed_at=now, finalizing_at=now,
+                     output_file_id=self._add_file(f"{batch['id']}_output.jsonl", "batch_output",
+                                                   output.encode("utf-8"))["id"],
+                     request_counts={"total": len(results), "completed": len(results), "failed": 0})
+
+    def _add_ft_event(self, job, message, kind="message", data=None):
+        job["_events"].append({"id": self._new_id("ftevent"), "object": "fine_tuning.job.event",
+                               "created_at": int(time.time()), "level": "info", "message": message,
+                               "type": kind, "data": data or {}})
+
+    # ジョブを1段階進める
+    def _advance_ft_job(self, job):
+        if job["status"] == "validating_files":
+            job["status"] = "running"
+            self._add_ft_event(job, "Fine-tuning job started")
+        elif job["status"] == "running" and job["_step"] < self.ft_steps:
+            job["_step"] += 1
+            loss = round(2.0 * 0.7 ** job["_step"], 4)
+            self._add_ft_event(job, f"Step {job['_step']}/{self.ft_steps}: training loss={loss}", "metrics",
+                               {"step": job["_step"], "total_steps": self.ft_steps, "train_loss": loss,
+                                "train_mean_token_accuracy": round(1 - loss / 4, 4)})
+        elif job["status"] == "running":
+            job.update(status="succeeded", finished_at=int(time.time()),
+                       fine_tuned_model=f"ft:{job['model']}:mock::{job['id'].split('-', 1)[1]}",
+                       trained_tokens=self.ft_steps * 1000)
+            self._add_ft_event(job, f"New fine-tuned model created: {job['fine_tuned_model']}")
+            self._add_ft_event(job, "The job has successfully completed")
+
+    def _ratelimit_headers(self):
+        used_requests = len(self.window)
+        used_tokens = sum(t for _, t in self.window)
+        headers = {}
+        if self.rpm:
+            headers.update({"x-ratelimit-limit-requests": str(self.rpm),
+                            "x-ratelimit-remaining-requests": str(max(0, self.rpm - used_requests)),
+                            "x-ratelimit-reset-requests": "1s"})
+        if self.tpm:
+            headers.update({"x-ratelimit-limit-tokens": str(self.tpm),
+                            "x-ratelimit-remaining-tokens": str(max(0, self.tpm - used_tokens)),
+                            "x-ratelimit-reset-tokens": "1s"})
+        return headers
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, obj, headers=None):
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            # stream=true の応答（chat.completion.chunk の SSE）
+            # reasoning_effort の指定があれば、先に推論の要約（reasoning_content）を返す。
+            def send_stream(self, body, content, prompt_tokens, completion_tokens, headers):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.close_connection = True
+                base = {"id": f"chatcmpl-mock-{server.requests}", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model") or "mock"}
+
+                def send_chunk(delta, finish_reason=None, **extra):
+                    chunk = dict(base, choices=[{"index": 0, "delta": delta,
+                                                 "finish_reason": finish_reason}], **extra)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                pieces = [{"reasoning_content": "mock reasoning"}] if body.get("reasoning_effort") else []
+                pieces += [{"content": content[i:i + STREAM_CHUNK_CHARS]}
+                           for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+                try:
+                    for i, delta in enumerate(pieces):
+                        if i:
+                            time.sleep(server.stream_interval)
+                        send_chunk(dict(delta, role="assistant") if i == 0 else delta)
+                    send_chunk({}, "stop")
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        chunk = dict(base, choices=[], usage={
+                            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens})
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # 途中で取り消された（クライアントが接続を閉じた）
+
+            def send_error_json(self, status, message):
+                self.send_json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+            # パスを "/" で分けた要素（先頭の /v1 は除く）と、クエリ文字列
+            def route(self):
+                url = urlsplit(self.path)
+                parts = [part for part in url.path.split("/") if part]
+                if parts and parts[0] == "v1":
+                    parts = parts[1:]
+                return parts, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                parts, _ = self.route()
+                if parts == ["chat", "completions"]:
+                    self.chat_completions(json.loads(data or b"{}"))
+                elif parts == ["files"]:
+                    self.create_file(data)
+                elif parts == ["batches"]:
+                    self.create_batch(json.loads(data or b"{}"))
+                elif parts == ["fine_tuning", "jobs"]:
+                    self.create_ft_job(json.loads(data or b"{}"))
+                else:
+                    self.send_error_json(404, "not found")
+
+            def do_GET(self):
+                parts, query = self.route()
+                if len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+                    self.file_content(parts[1])
+                elif len(parts) == 2 and parts[0] == "batches":
+                    self.retrieve_batch(parts[1])
+                elif len(parts) == 3 and parts[:2] == ["fine_tuning", "jobs"]:
+                    self.retrieve_ft_job(parts[2])
+                elif len(parts) == 4 and parts[:2] == ["fine_tuning", "jobs"] and parts[3] == "events":
+                    self.list_ft_events(parts[2], int(query.get("limit", 20)), query.get("after"))
+                else:
+                    self.send_error_json(404, "not found")
+
+            #----------------------------------------------------------
+            # Files / Batch API
+            def create_file(self, data):
+                fields = parse_multipart(self.headers.get("Content-Type", ""), data)
+                if "file" not in fields:
+                    self.send_error_json(400, "file is required")
+                    return
+                filename, content = fields["file"]
+                purpose = (fields.get("purpose") or (None, b""))[1].decode("utf-8")
+                with server.lock:
+                    meta = server._add_file(filename, purpose, content)
+                self.send_json(200, meta)
+
+            def file_content(self, file_id):
+                with server.lock:
+                    entry = server.files.get(file_id)
+                if entry is None:
+                    self.send_error_json(404, f"No such File object: {file_id}")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(entry[1])))
+                self.end_headers()
+                self.wfile.write(entry[1])
+
+            def create_batch(self, body):
+                with server.lock:
+                    if body.get("input_file_id") not in server.files:
+                        self.send_error_json(400, f"No such File object: {body.get('input_file_id')}")
+                        return
+                    batch = {"id": server._new_id("batch"), "object": "batch",
+                             "endpoint": body.get("endpoint"), "input_file_id": body["input_file_id"],
+                             "completion_window": body.get("completion_window", "24h"),
+                             "status": "in_progress", "created_at": int(time.time()),
+                             "in_progress_at": int(time.time()), "output_file_id": None,
+                             "error_file_id": None, "errors": None, "metadata": body.get("metadata"),
+                             "request_counts": {"total": 0, "completed": 0, "failed": 0}, "_polls": 0}
+                    server.batches[batch["id"]] = batch
+                    self.send_json(200, public(batch))
+
+            def retrieve_batch(self, batch_id):
+                with server.lock:
+                    batch = server.batches.get(batch_id)
+                    if batch is None:
+                        self.send_error_json(404, f"No such Batch object: {batch_id}")
+                        return
+                    batch["_polls"] += 1
+                    if batch["status"] == "in_progress" and batch["_polls"] >= server.batch_polls:
+                        server._complete_batch(batch)
+                    self.send_json(200, public(batch))
+
+            #----------------------------------------------------------
+            # Fine-tuning API
+            def create_ft_job(self, body):
+                with server.lock:
+                    if body.get("training_file") not in server.files:
+                        self.send_error_json(400, f"No such File object: {body.get('training_file')}")
+                        return
+                    job = {"id": server._new_id("ftjob"), "object": "fine_tuning.job",
+                           "model": body.get("model") or "mock", "created_at": int(time.time()),
+                           "status": "validating_files", "fine_tuned_model": None, "finished_at": None,
+                           "training_file": body["training_file"],
+                           "validation_file": body.get("validation_file"),
+                           "hyperparameters": body.get("hyperparameters") or {"n_epochs": "auto"},
+                           "organization_id": "org-mock", "result_files": [], "trained_tokens": None,
+                           "seed": body.get("seed") or 0, "error": None, "_step": 0, "_events": []}
+                    server.ft_jobs[job["id"]] = job
+                    server._add_ft_event(job, f"Validating training file: {job['training_file']}")
+                    self.send_json(200, public(job))
+
+            def retrieve_ft_job(self, job_id):
+                with server.lock:
+                    job = server.ft_jobs.get(job_id)
+                    if job is None:
+                        self.send_error_json(404, f"No such fine-tuning job: {job_id}")
+                        return
+                    server._advance_ft_job(job)
+                    self.send_json(200, public(job))
+
+            # 新しい順に並べ、after の次から limit 件を返す
+            def list_ft_events(self, job_id, limit, after):
+                with server.lock:
+                    job = server.ft_jobs.get(job_id)
+                    if job is None:
+                        self.send_error_json(404, f"No such fine-tuning job: {job_id}")
+                        return
+                    events = job["_events"][::-1]
+                    ids = [event["id"] for event in events]
+                    start = ids.index(after) + 1 if after in ids else 0
+                    page = events[start:start + limit]
+                    server.event_requests += 1
+                    server.events_returned += len(page)
+                    self.send_json(200, {"object": "list", "data": page,
+                                         "has_more": start + limit < len(events)})
+
+            #----------------------------------------------------------
+            def chat_completions(self, body):
+                started = time.perf_counter()
+                prompt_tokens = prompt_token_count(body)
+                max_tokens = body.get("max_tokens") or 0
+
+                with server.lock:
+                    server.requests += 1
+                    retry_after = server._check_rate_limit(prompt_tokens + max_tokens)
+                    failed = retry_after is None and server.random.random() < server.error_rate
+                    delay = server.latency + server.random.uniform(0, server.jitter)
+                    headers = server._ratelimit_headers()
+
+                if retry_after is not None:
+                    with server.lock:
+                        server.rate_limited += 1
+                    headers["retry-after-ms"] = str(int(retry_after * 1000))
+                    self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                   "code": "rate_limit_exceeded"}}, headers)
+                    return
+
+                time.sleep(delay)
+                if failed:
+                    with server.lock:
+                        server.errors += 1
+                    self.send_json(500, {"error": {"message": "mock server error", "type": "server_error"}})
+                    return
+
+                tool_calls = make_tool_calls(body, server.requests)
+                if tool_calls:
+                    completion_tokens = estimate_tokens(json.dumps(tool_calls))
+                    self.send_json(200, {
+                        "id": f"chatcmpl-mock-{server.requests}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model") or "mock",
+                        "choices": [{"index": 0, "finish_reason": "tool_calls",
+                                     "message": {"role": "assistant", "content": None,
+                                                 "tool_calls": tool_calls}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                  "total_tokens": prompt_tokens + completion_tokens},
+                    }, headers)
+                    with server.lock:
+                        server.latencies.append(time.perf_counter() - started)
+                    return
+
+                content = make_reply(body)
+                completion_tokens = estimate_tokens(content)
+                if body.get("stream"):
+                    self.send_stream(body, content, prompt_tokens, completion_tokens, headers)
+                    with server.lock:
+                        server.latencies.append(time.perf_counter() - started)
+                    return
+                self.send_json(200, chat_completion(body, content, prompt_tokens, completion_tokens,
+                                                    server.requests), headers)
+                with server.lock:
+                    server.latencies.append(time.perf_counter() - started)
+
+        return Handler
+
+# 単独で起動する例（OPENAI_BASE_URL=http://127.0.0.1:8000/v1 を設定して翻訳を実行する）
+#   python mock_openai_server.py --port 8000 --latency 0.2 --error-rate 0.01 --rpm 500
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える揺らぎの最大値（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 を返す割合")
+    parser.add_argument("--rpm", type=int, default=0, help="1分あたりのリクエスト数の上限（0 で無制限）")
+    parser.add_argument("--tpm", type=int, default=0, help="1分あたりのトークン数の上限（0 で無制限）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream-interval", type=float, default=0.01, help="ストリーミングの断片の間隔（秒）")
+    parser.add_argument("--batch-polls", type=int, default=1, help="バッチが完了するまでの取得回数")
+    parser.add_argument("--ft-steps", type=int, default=5, help="ファインチューニングの学習ステップ数")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.jitter,
+                              args.error_rate, args.rpm, args.tpm, args.seed, args.stream_interval,
+                              args.batch_polls, args.ft_steps)
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,174 @@
+import asyncio
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from docx_stream import extract_paragraphs, write_translations
+from docx_utils import extract_paragraphs_docx, group_segments, uniquify, write_translations_docx
+from translate_engine import SYSTEM_PROMPT, create_async_client, translate_all
+from translation_cache import normalize_text
+from telemetry import record_cache_hit
+
+# 複数の .docx をまとめて翻訳する
+#   ・文書の解析（extract_paragraphs）と書き出し（write_translations）はプロセスプールで並列に行う
+#   ・翻訳は全文書で1つのクライアント・セマフォ・RateLimiter を共有する
+#   ・同じ原文は文書をまたいでも1回だけ翻訳する
+#   ・文書ごとに、必要な翻訳が揃った時点で保存する
+#   ・文書の読み書きは [docx] engine に合わせる（stream: docx_stream / python-docx: docx_utils）
+#   ・verify_matcher を渡すと、用語の対訳が翻訳結果に含まれていない段落を use.log に記録する
+
+# エンジン名 → (段落の取り出し, 翻訳の書き込み)
+DOCX_ENGINES = {
+    "stream": (extract_paragraphs, write_translations),
+    "python-docx": (extract_paragraphs_docx, write_translations_docx),
+}
+
+#======================================================================
+# 引数（ファイル・フォルダ・glob パターン）を .docx のパスのリストに展開する
+# 出力ファイル（output_*）と Word の一時ファイル（~$*）は除く。
+def resolve_inputs(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = sorted(Path(item).glob("*.docx"))
+        elif glob.has_magic(item):
+            candidates = sorted(Path(p) for p in glob.glob(item, recursive=True))
+        else:
+            candidates = [Path(item)]
+        for path in candidates:
+            if path.name.startswith(("output_", "~$")) or path in paths:
+                continue
+            paths.append(path)
+    return paths
+
+#======================================================================
+# 複数文書の翻訳本体（非同期）
+async def translate_documents(paths, client, modelID, pool, concurrency=8, token_budget=0,
+                              limiter=None, retry_rounds=0, cache=None, prompt_for=None,
+                              matcher=None, output_dir=None, max_chunk_tokens=0, fast_path=None,
+                              engine="stream", verify_matcher=None):
+    loop = asyncio.get_running_loop()
+    extract, write = DOCX_ENGINES[engine]
+    if prompt_for is None:
+        prompt_for = lambda text: SYSTEM_PROMPT
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    futures = {}
+    summary = {"documents": 0, "failed": 0, "paragraphs": 0, "api": 0, "errors": 0, "flagged": 0}
+    verified = set()
+
+    async def process_document(path):
+        started = time.perf_counter()
+        targets = await loop.run_in_executor(pool, extract, path)
+        segments, segment_ids = group_segments(targets)
+        keys = [normalize_text(text) for text in segments]
+
+        # まだどの文書でも扱っていない原文だけを翻訳する
+        # 規則で訳せる段落（fast_path.FastPath）は API も翻訳メモリも使わない。
+        new = []
+        owned = []
+        cache_hits = 0
+        try:
+            for key, text in zip(keys, segments):
+                if key in futures:
+                    continue
+                futures[key] = loop.create_future()
+                owned.append(key)
+                local = fast_path.translate(text) if fast_path else None
+                if local is not None:
+                    futures[key].set_result(local)
+                    continue
+                cached = cache.get(modelID, text, system_prompt=prompt_for(text)) if cache else None
+                if cached is None:
+                    new.append((key, text))
+                else:
+                    futures[key].set_result(cached)
+                    cache_hits += 1
+            record_cache_hit("chat", modelID, cache_hits)
+
+            results = await translate_all(client, modelID, [text for _, text in new],
+                                          token_budget=token_budget, limiter=limiter,
+                                          retry_rounds=retry_rounds, semaphore=semaphore,
+                                          desc=path.name, matcher=matcher,
+                                          max_chunk_tokens=max_chunk_tokens)
+            for (key, text), translated in zip(new, results):
+                futures[key].set_result(translated)
+                if cache and not isinstance(translated, Exception):
+                    cache.put(modelID, text, translated, system_prompt=prompt_for(text))
+        finally:
+            # 途中で失敗・取り消しになった時は、この文書が受け持った原文を待っている他の文書に失敗を伝える
+            for key in owned:
+                if not futures[key].done():
+                    futures[key].set_exception(RuntimeError(f"{path.name} の翻訳が中断されました"))
+
+        # 他の文書で翻訳中の原文も含めて、全部揃うのを待ってから保存する
+        # 他の文書で失敗した原文は、この文書では未翻訳として数える。
+        segment_results = await asyncio.gather(*(futures[key] for key in keys), return_exceptions=True)
+        translations = {}
+        errors = 0
+        for (pid, _), segment_id in zip(targets, segment_ids):
+            translated = segment_results[segment_id]
+            if isinstance(translated, Exception):
+                errors += 1
+            else:
+                translations[pid] = translated
+
+        # 用語の照合は原文ごとに1回だけ（文書をまたいで同じ原文は確認済み）
+        if verify_matcher:
+            for key, text, translated in zip(keys, segments, segment_results):
+                if key in verified or isinstance(translated, Exception):
+                    continue
+                verified.add(key)
+                missing = verify_matcher.missing_terms(text, translated)
+                if missing:
+                    summary["flagged"] += 1
+                    logging.warning("用語不一致: %s: %s -> %s / 期待: %s", path.name, text, translated,
+                                    ", ".join(f"{jp}={en}" for jp, en in missing))
+
+        output_path = uniquify(Path(output_dir or path.parent) / f"output_{path.name}")
+        await loop.run_in_executor(pool, write, path, output_path, translations)
+
+        summary["documents"] += 1
+        summary["paragraphs"] += len(targets)
+        summary["api"] += len(new)
+        summary["errors"] += errors
+        print(f"完了: {output_path} (段落 {len(targets)} / API翻訳 {len(new)} / "
+              f"未翻訳 {errors} / {time.perf_counter() - started:.1f} 秒)")
+
+    async def process_document_safely(path):
+        try:
+            await process_document(path)
+        except Exception as e:
+            summary["failed"] += 1
+            print(f"エラー: {path}: {e}")
+
+    await asyncio.gather(*(process_document_safely(path) for path in paths))
+    return summary
+
+#======================================================================
+# 同期コードから呼び出すための入口。最後に全体の処理量を表示する。
+def run_translate_documents(paths, api_key, modelID, workers=None, **kwargs):
+    if not paths:
+        print("翻訳する .docx がありません")
+        return None
+    if kwargs.get("output_dir"):
+        Path(kwargs["output_dir"]).mkdir(parents=True, exist_ok=True)
+
+    async def _main():
+        client = create_async_client(api_key, 0 if kwargs.get("limiter") else 2)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return await translate_documents(paths, client, modelID, pool, **kwargs)
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    summary = asyncio.run(_main())
+    elapsed = time.perf_counter() - started
+    print(f"文書数: {summary['documents']} (失敗 {summary['failed']}) / 段落数: {summary['paragraphs']} / "
+          f"API翻訳: {summary['api']} / 未翻訳: {summary['errors']} / "
+          f"経過時間: {elapsed:.1f} 秒 / {summary['paragraphs'] / max(elapsed, 1e-9):.1f} 段落/秒")
+    if kwargs.get("verify_matcher"):
+        print(f"用語チェック: 不一致 {summary['flagged']} 件（詳細は use.log）")
+    return summary
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import re
+import time
+
+# API 呼び出しのペース配分と再試行
+#   ・組織の RPM（リクエスト数/分）・TPM（トークン数/分）に合わせたトークンバケットで送信間隔を調整する
+#   ・応答ヘッダー（x-ratelimit-*）の残り回数・リセットまでの時間でバケットを補正する
+#   ・429 / 5xx / 接続エラーはジッター付き指数バックオフで再試行する
+
+# 再試行の対象とする例外
+# openai は読み込みに時間がかかるため、API を呼ぶ時に import する（起動を速くするため）。
+def retryable_errors():
+    import openai
+    return (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+#======================================================================
+# "1s", "6m0s", "20ms", "0.5s" のような時間表記を秒に変換する
+def parse_duration(value):
+    if not value:
+        return 0.0
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    total = 0.0
+    for number, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value):
+        total += float(number) * units[unit]
+    return total
+
+#======================================================================
+# 1分あたり capacity まで使えるトークンバケット
+class TokenBucket:
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    # amount を使えるようになるまでの待ち時間（秒）
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    # サーバーが返した残量・上限に合わせる（こちらの見積もりより少ない時だけ下げる）
+    def update(self, remaining=None, limit=None):
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+#======================================================================
+# RPM・TPM の2つのバケットで送信を調整する
+class RateLimiter:
+    def __init__(self, rpm, tpm, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.retries = 0
+        self.lock = asyncio.Lock()
+
+    # リクエスト1件（推定 tokens トークン）を送ってよくなるまで待つ
+    async def acquire(self, tokens):
+        async with self.lock:
+            while True:
+                wait = max(self.requests.wait_time(1),
+                           self.tokens.wait_time(tokens),
+                           self.paused_until - time.monotonic())
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    # 全リクエストの送信を delay 秒止める
+    def pause(self, delay):
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    # 応答ヘッダーの x-ratelimit-* を反映する
+    def update_from_headers(self, headers):
+        def number(name):
+            value = headers.get(name)
+            return int(value) if value and value.isdigit() else None
+
+        remaining_requests = number("x-ratelimit-remaining-requests")
+        remaining_tokens = number("x-ratelimit-remaining-tokens")
+        self.requests.update(remaining_requests, number("x-ratelimit-limit-requests"))
+        self.tokens.update(remaining_tokens, number("x-ratelimit-limit-tokens"))
+        if remaining_requests == 0:
+            self.pause(parse_duration(headers.get("x-ratelimit-reset-requests")))
+        if remaining_tokens == 0:
+            self.pause(parse_duration(headers.get("x-ratelimit-reset-tokens")))
+
+    # attempt 回目の再試行までの待ち時間（retry-after があればそれを優先する）
+    def backoff_delay(self, attempt, error=None):
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after_ms = response.headers.get("retry-after-ms")
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after_ms:
+                    return float(retry_after_ms) / 1000
+                if retry_after:
+                    return float(retry_after)
+            except ValueError:
+                pass
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    # chat.completions.create を、ペース配分と再試行付きで呼び出す
+    # stats（辞書）を渡すと、このリクエストの再試行回数を stats["retries"] に入れる。
+    async def create_completion(self, client, tokens, stats=None, **params):
+        import openai
+        errors = retryable_errors()
+        attempt = 0
+        while True:
+            if stats is not None:
+                stats["retries"] = attempt
+            await self.acquire(tokens)
+            try:
+                raw = await client.chat.completions.with_raw_response.create(**params)
+            except errors as e:
+                if attempt >= self.max_retries:
+                    raise
+                response = getattr(e, "response", None)
+                if response is not None:
+                    self.update_from_headers(response.headers)
+                delay = self.backoff_delay(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    # 429 の時は他のリクエストも止めて、上限を超え続けないようにする
+                    self.pause(delay)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.update_from_headers(raw.headers)
+            return raw.parse()
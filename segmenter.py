@@ -0,0 +1,80 @@
+import re
+from token_utils import count_tokens
+
+# 長い段落の分割
+#   ・日本語の文の区切り（。！？ と改行）で文に分け、トークン数が上限以内になるように文をまとめる
+#   ・1文だけで上限を超える時は「、」で、それでも超える時は文字数で分ける
+#   ・分けた断片は並列に翻訳し、翻訳結果をつなげて1つの段落に戻す（translate_engine.translate_all）
+# 出力トークン数の上限も、固定値ではなく入力のトークン数から決める（output_token_limit）。
+
+# 文の終わり（閉じ括弧・引用符・直後の改行は前の文に含める）と改行
+SENTENCE_END = re.compile(r"[。．！？!?]+[」』）)】〕\"'”’]*\n*|\n+")
+CLAUSE_END = re.compile(r"[、，,]")
+
+# 出力トークン数の上限 = 入力のトークン数 × OUTPUT_TOKEN_RATIO + OUTPUT_TOKEN_MARGIN
+# 日本語 → 英語では、英語のトークン数は多くても日本語の2倍程度に収まる。
+OUTPUT_TOKEN_RATIO = 2.0
+OUTPUT_TOKEN_MARGIN = 32
+MAX_OUTPUT_TOKENS = 4096
+
+#======================================================================
+# 入力のテキストから出力トークン数の上限を決める
+def output_token_limit(text, ratio=OUTPUT_TOKEN_RATIO, margin=OUTPUT_TOKEN_MARGIN):
+    return min(MAX_OUTPUT_TOKENS, int(count_tokens(text) * ratio) + margin)
+
+#======================================================================
+# 区切り文字の直後で分ける（区切り文字は前の断片に含める。つなげると元のテキストに戻る）
+def _split_after(pattern, text):
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return [piece for piece in pieces if piece]
+
+def split_sentences(text):
+    return _split_after(SENTENCE_END, text)
+
+# 上限を超える1文を、「、」→ 文字数の順に分ける
+def _split_long(sentence, max_tokens):
+    if count_tokens(sentence) <= max_tokens:
+        return [sentence]
+    clauses = _split_after(CLAUSE_END, sentence)
+    if len(clauses) > 1:
+        return _pack(clauses, max_tokens)
+    # 1文字は多くても3トークン（UTF-8 の3バイト）なので、max_tokens // 3 文字ずつなら上限以内に収まる
+    size = max(1, max_tokens // 3)
+    return [sentence[i:i + size] for i in range(0, len(sentence), size)]
+
+# 断片を先頭から順に、トークン数が max_tokens 以内になるようにまとめる
+def _pack(pieces, max_tokens):
+    chunks = []
+    current = ""
+    for piece in pieces:
+        for part in _split_long(piece, max_tokens):
+            if current and count_tokens(current + part) > max_tokens:
+                chunks.append(current)
+                current = ""
+            current += part
+    if current:
+        chunks.append(current)
+    return chunks
+
+#======================================================================
+# テキストを max_tokens 以内の断片に分ける（上限以内ならそのまま1つ）
+def chunk_text(text, max_tokens):
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return [text]
+    return _pack(split_sentences(text), max_tokens)
+
+# 断片ごとの翻訳をつなげて1つの段落にする
+# 原文の断片が改行で終わっていれば改行で、それ以外は空白でつなぐ。
+def join_translations(chunks, translations):
+    parts = []
+    for i, (chunk, translated) in enumerate(zip(chunks, translations)):
+        parts.append(translated.strip())
+        if i < len(chunks) - 1:
+            parts.append("\n" if chunk.endswith("\n") else " ")
+    return "".join(parts)
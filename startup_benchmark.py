@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from docx import Document
+from benchmark import SCRIPT, environment_info, write_config
+
+# 翻訳ツールの起動時間の計測（ソース版・PyInstaller 版）
+#   interpreter   : python -c pass（Python 自体の起動時間。ソース版のみ）
+#   eager_imports : openai・docx・tiktoken・tqdm をすべて import した場合（ソース版のみ、比較用）
+#   help          : --help を表示して終わるまで
+#   offline_run   : 数値・日付だけの文書を翻訳して保存するまで（全段落がローカル変換で済むため API は呼ばない）
+#                   接続先を使えないアドレスにし、ネットワークなしで完了することも確かめる
+# 各ケースを runs 回実行し、最小・中央値・最大（秒）を JSON Lines で出力する。
+
+EAGER_IMPORTS = "import openai, docx, tiktoken, tqdm"
+# 接続できないアドレス（API を呼べば失敗する）
+OFFLINE_BASE_URL = "http://127.0.0.1:9/v1"
+
+#======================================================================
+# ローカル変換だけで翻訳できる文書（表に数値・日付・期間だけを入れる）
+def generate_offline_docx(path):
+    doc = Document()
+    doc.add_paragraph("2025年3月期 第1四半期")
+    table = doc.add_table(rows=3, cols=3)
+    cells = [["（単位：百万円）", "2024年3月期", "2025年3月期"],
+             ["12.5%", "1,234", "△56"],
+             ["2025年3月31日", "1,234百万円", "3.2ポイント"]]
+    for row, values in zip(table.rows, cells):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    doc.save(path)
+    return path
+
+def measure(command, runs, env=None, cwd=None):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(command, env=env, cwd=cwd, capture_output=True, text=True)
+        timings.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(map(str, command))} が失敗しました:\n{completed.stderr[-2000:]}")
+    return {"runs": runs, "min": round(min(timings), 4),
+            "median": round(statistics.median(timings), 4), "max": round(max(timings), 4)}
+
+def run_cases(build, command, workdir, runs):
+    config_path = write_config(Path(workdir) / "startup.ini",
+                               generate_offline_docx(Path(workdir) / "offline.docx"),
+                               {"translate.concurrency": "8", "telemetry.enabled": "no",
+                                "fast_path.enabled": "yes", "fast_path.glossary": "no"})
+    env = dict(os.environ, OPENAI_BASE_URL=OFFLINE_BASE_URL)
+    env.setdefault("API_9519-01_TRY", "offline")
+    cases = []
+    if build == "source":
+        cases += [("interpreter", [sys.executable, "-c", "pass"]),
+                  ("eager_imports", [sys.executable, "-c", EAGER_IMPORTS])]
+    cases += [("help", command + ["--help"]),
+              ("offline_run", command + ["--config", str(config_path), "--output-dir", str(workdir)])]
+    for case, case_command in cases:
+        yield {"build": build, "case": case, **measure(case_command, runs, env, workdir)}
+
+# 実行例
+#   python startup_benchmark.py
+#   python startup_benchmark.py --exe dist/use_fine-tuning/use_fine-tuning --runs 10 --output startup.jsonl
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exe", default=None, help="PyInstaller で作った実行ファイル（build_exe.py）")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None, help="結果を追記する JSON Lines ファイル")
+    args = parser.parse_args()
+
+    builds = [("source", [sys.executable, str(SCRIPT)])]
+    if args.exe:
+        builds.append(("frozen", [str(Path(args.exe).resolve())]))
+
+    info = environment_info()
+    with tempfile.TemporaryDirectory() as workdir:
+        for build, command in builds:
+            for result in run_cases(build, command, workdir, args.runs):
+                line = json.dumps(dict(info, **result), ensure_ascii=False)
+                print(line, flush=True)
+                if args.output:
+                    with open(args.output, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
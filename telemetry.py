@@ -0,0 +1,230 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# API 呼び出しの計測（遅延・トークン数・再試行・キャッシュヒット・推定費用）
+#   ・record_request() で1回の呼び出しを記録し、(種類, モデル) ごとに集計する
+#   ・configure() で出力先を指定すると、記録を1件ずつ JSON Lines に追記し、
+#     finish() で Prometheus の textfile（node_exporter の textfile collector 用）を書き出す
+#   ・finish() は実行の最後に集計結果を表示する
+#   ・遅延のパーセンタイルは、最大 LATENCY_SAMPLES 件の無作為抽出（リザーバーサンプリング）から求める。
+#     常駐するサービス（agent_service.py）でもメモリが増え続けない。件数がこれ以下なら正確な値になる。
+
+# モデルごとの料金（USD / 100万トークン、(入力, 出力)）。モデルIDの前方一致で、長いものを優先する。
+# ファインチューニング済みモデルは "ft:<元のモデル>:..." の形式。
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "ft:gpt-3.5-turbo": (3.00, 6.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "ft:gpt-4o-mini": (0.30, 1.20),
+    "gpt-4o": (2.50, 10.00),
+    "ft:gpt-4o": (3.75, 15.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5": (1.25, 10.00),
+}
+
+# (種類, モデル) ごとに保持する遅延の件数
+LATENCY_SAMPLES = 4096
+
+_lock = threading.Lock()
+_random = random.Random()
+_stats = {}
+_jsonl_file = None
+_prometheus_path = None
+
+#======================================================================
+# 推定費用（USD）。料金が分からないモデルは 0 とする。
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    for prefix in sorted(PRICES, key=len, reverse=True):
+        if (model or "").startswith(prefix):
+            input_price, output_price = PRICES[prefix]
+            return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return 0.0
+
+#======================================================================
+# 出力先を指定する（指定しなければ集計だけ行う）
+def configure(jsonl_path=None, prometheus_path=None):
+    global _jsonl_file, _prometheus_path
+    if jsonl_path:
+        Path(jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+        _jsonl_file = open(jsonl_path, "a", encoding="utf-8")
+    if prometheus_path:
+        Path(prometheus_path).parent.mkdir(parents=True, exist_ok=True)
+        _prometheus_path = Path(prometheus_path)
+
+# config.ini の [telemetry] に従って出力先を設定する
+# 出力ファイルは <dir>/<name>.jsonl と <dir>/<name>.prom
+def configure_from_config(config, base_dir, name):
+    if not config.getboolean('telemetry', 'enabled', fallback=False):
+        return False
+    out_dir = Path(base_dir) / config.get('telemetry', 'dir', fallback='metrics')
+    configure(out_dir / f"{name}.jsonl", out_dir / f"{name}.prom")
+    return True
+
+def _entry(kind, model):
+    key = (kind, model or "")
+    entry = _stats.get(key)
+    if entry is None:
+        entry = _stats[key] = {"requests": 0, "errors": 0, "retries": 0, "cache_hits": 0,
+                               "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                               "latency_sum": 0.0, "latencies": []}
+    return entry
+
+# 遅延をリザーバーに加える（n 件目は LATENCY_SAMPLES / n の確率で残す）
+# entry["requests"] はこの呼び出しを数えた後の件数。
+def _sample_latency(entry, latency):
+    latencies = entry["latencies"]
+    if len(latencies) < LATENCY_SAMPLES:
+        latencies.append(latency)
+        return
+    index = _random.randrange(entry["requests"])
+    if index < LATENCY_SAMPLES:
+        latencies[index] = latency
+
+def _write(record):
+    if _jsonl_file:
+        _jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        _jsonl_file.flush()
+
+#======================================================================
+# API 呼び出し1回分を記録する
+# kind は呼び出しの種類（"chat", "files.create", "agent" など）、error は失敗時の例外。
+def record_request(kind, model, latency, prompt_tokens=0, completion_tokens=0,
+                   retries=0, error=None, **extra):
+    prompt_tokens = prompt_tokens or 0
+    completion_tokens = completion_tokens or 0
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    record = {"time": time.time(), "kind": kind, "model": model, "latency": round(latency, 6),
+              "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+              "retries": retries, "cost": cost, "error": type(error).__name__ if error else None}
+    record.update(extra)
+    with _lock:
+        entry = _entry(kind, model)
+        entry["requests"] += 1
+        entry["errors"] += 1 if error else 0
+        entry["retries"] += retries
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        entry["cost"] += cost
+        entry["latency_sum"] += latency
+        _sample_latency(entry, latency)
+        _write(record)
+
+# chat.completions などの応答（usage 付き）を記録する
+def record_response(kind, model, latency, response, retries=0, **extra):
+    usage = getattr(response, "usage", None)
+    record_request(kind, model, latency,
+                   getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0),
+                   retries, **extra)
+
+# API を呼ばずに翻訳メモリ等から結果を得た件数を記録する
+def record_cache_hit(kind, model, count=1):
+    if count <= 0:
+        return
+    with _lock:
+        _entry(kind, model)["cache_hits"] += count
+        _write({"time": time.time(), "kind": kind, "model": model, "cache_hits": count})
+
+# with ブロックの所要時間を、トークン数なしの呼び出しとして記録する
+#   with timed("files.create", model): client.files.create(...)
+@contextmanager
+def timed(kind, model=None, **extra):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_request(kind, model, time.perf_counter() - started, error=e, **extra)
+        raise
+    record_request(kind, model, time.perf_counter() - started, **extra)
+
+#======================================================================
+# 昇順に並べた values の p パーセンタイル（最近傍順位法）
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+# (種類, モデル) ごとの集計結果
+def summary():
+    with _lock:
+        result = []
+        for (kind, model), entry in sorted(_stats.items()):
+            latencies = sorted(entry["latencies"])
+            item = {key: value for key, value in entry.items() if key != "latencies"}
+            item.update(kind=kind, model=model,
+                        latency_p50=_percentile(latencies, 50),
+                        latency_p95=_percentile(latencies, 95),
+                        latency_p99=_percentile(latencies, 99))
+            result.append(item)
+        return result
+
+#======================================================================
+# Prometheus のテキスト形式
+def _format_labels(labels):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+def prometheus_text(prefix="jpen"):
+    items = summary()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{prefix}_{name}{_format_labels(labels)} {value}")
+
+    def labels(item, **more):
+        return dict({"kind": item["kind"], "model": item["model"]}, **more)
+
+    metric("requests_total", "counter", "API requests.",
+           [(labels(i), i["requests"]) for i in items])
+    metric("request_errors_total", "counter", "Failed API requests.",
+           [(labels(i), i["errors"]) for i in items])
+    metric("request_retries_total", "counter", "Retries of API requests.",
+           [(labels(i), i["retries"]) for i in items])
+    metric("cache_hits_total", "counter", "Results served without calling the API.",
+           [(labels(i), i["cache_hits"]) for i in items])
+    metric("tokens_total", "counter", "Tokens used.",
+           [(labels(i, type="prompt"), i["prompt_tokens"]) for i in items] +
+           [(labels(i, type="completion"), i["completion_tokens"]) for i in items])
+    metric("cost_usd_total", "counter", "Estimated cost in USD.",
+           [(labels(i), round(i["cost"], 6)) for i in items])
+    metric("request_latency_seconds", "summary", "API request latency.",
+           [(labels(i, quantile=q), i[f"latency_p{round(q * 100)}"]) for i in items for q in (0.5, 0.95, 0.99)])
+    for i in items:
+        lines.append(f"{prefix}_request_latency_seconds_sum{_format_labels(labels(i))} {i['latency_sum']}")
+        lines.append(f"{prefix}_request_latency_seconds_count{_format_labels(labels(i))} {i['requests']}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+#======================================================================
+# 実行の最後に呼ぶ。集計結果を表示し、textfile を書き出して JSON Lines を閉じる。
+def finish(show=True):
+    global _jsonl_file
+    if show:
+        for item in summary():
+            print(f"API計測: {item['kind']} {item['model']} / リクエスト {item['requests']} "
+                  f"(エラー {item['errors']} / 再試行 {item['retries']}) / キャッシュ {item['cache_hits']} / "
+                  f"トークン 入力 {item['prompt_tokens']} 出力 {item['completion_tokens']} / "
+                  f"推定費用 ${item['cost']:.4f} / 遅延 p50 {item['latency_p50']:.2f}s "
+                  f"p95 {item['latency_p95']:.2f}s p99 {item['latency_p99']:.2f}s")
+    if _prometheus_path:
+        write_prometheus(_prometheus_path)
+    if _jsonl_file:
+        _jsonl_file.close()
+        _jsonl_file = None
@@ -0,0 +1,56 @@
+import pytest
+from fast_path import FastPath
+
+# fast_path の規則ベース変換の確認（python -m pytest test_fast_path.py）
+
+@pytest.fixture
+def fast_path():
+    return FastPath({"売上高": "Net sales"})
+
+#======================================================================
+# 空白で区切られた複数の数値は1つにつなげず、そのまま使う
+@pytest.mark.parametrize("text", ["2024 2025", "10 20 30", "1,234 5,678", "12.5% 13.0%", "△12 △34"])
+def test_multiple_numbers_are_not_joined(fast_path, text):
+    assert fast_path.match(text) == (text, "no_japanese")
+
+def test_multiple_numbers_without_passthrough():
+    assert FastPath(skip_non_japanese=False).match("2024 2025") == (None, None)
+
+def test_multiple_numbers_with_units_go_to_api(fast_path):
+    assert fast_path.match("1,234百万円 5,678百万円") == (None, None)
+
+#======================================================================
+# 数値と単位の間の空白は認める
+@pytest.mark.parametrize("text, expected", [
+    ("△12", "-12"),
+    ("1,234百万円", "1,234 million yen"),
+    ("1,234 百万円", "1,234 million yen"),
+    ("12.5 ％", "12.5%"),
+    ("１２．５％", "12.5%"),
+    ("1円 50銭", "1.50 yen"),
+    ("1人", "1 person"),
+    ("2人", "2 persons"),
+    ("1.0人", "1.0 persons"),
+    ("1,000株", "1,000 shares"),
+    ("1千株", "1 thousand shares"),
+    ("1ヶ月", "1 month"),
+    ("1百万円", "1 million yen"),
+    ("（単位： 百万円）", "(Millions of yen)"),
+])
+def test_number_with_unit(fast_path, text, expected):
+    assert fast_path.match(text) == (expected, "number")
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025年3月期 第1四半期", "Q1 FY2025/3"),
+    ("2025年3月31日", "March 31, 2025"),
+    ("令和7年3月期", "FY2025/3"),
+    ("2024年度", "FY2024"),
+])
+def test_period(fast_path, text, expected):
+    assert fast_path.match(text) == (expected, "period")
+
+def test_glossary_and_stats(fast_path):
+    assert fast_path.translate("売上高") == "Net sales"
+    assert fast_path.translate("当期の業績は好調でした。") is None
+    stats = fast_path.stats()
+    assert (stats["segments"], stats["hits"], stats["glossary"]) == (2, 1, 1)
@@ -0,0 +1,44 @@
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# ファインチューニング元の gpt-3.5-turbo / gpt-4 系で使われるエンコーディング
+DEFAULT_ENCODING = "cl100k_base"
+
+# 同梱する tiktoken のデータ（オフライン環境用）
+# PyInstaller でまとめた実行ファイルでは、展開先のフォルダ（sys._MEIPASS）の中を見る。
+# このフォルダがあれば TIKTOKEN_CACHE_DIR に使い、エンコーディングをダウンロードせずに読み込む。
+BUNDLED_CACHE_DIR = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent)) / "tiktoken_cache"
+
+#======================================================================
+# tiktoken のエンコーディングを取得する（読み込みは初回だけ）
+# tiktoken は初めて使う時に import する（起動を速くするため）。
+@lru_cache(maxsize=None)
+def get_encoding(name=DEFAULT_ENCODING):
+    if BUNDLED_CACHE_DIR.is_dir():
+        os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(BUNDLED_CACHE_DIR))
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+#======================================================================
+# テキストのトークン数を数える
+def count_tokens(text, encoding_name=DEFAULT_ENCODING):
+    return len(get_encoding(encoding_name).encode(text))
+
+#======================================================================
+# エンコーディングのデータを cache_dir に保存する（実行ファイルに同梱するため。ネットワークが必要）
+def bundle_encoding(name=DEFAULT_ENCODING, cache_dir=BUNDLED_CACHE_DIR):
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = str(cache_dir)
+    import tiktoken
+    tiktoken.get_encoding(name)
+    return sorted(cache_dir.iterdir())
+
+# 同梱用のデータを作成する
+#   python token_utils.py [エンコーディング名 ...]
+if __name__ == "__main__":
+    for encoding_name in sys.argv[1:] or [DEFAULT_ENCODING]:
+        for path in bundle_encoding(encoding_name):
+            print(f"{encoding_name}: {path}")
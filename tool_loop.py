@@ -0,0 +1,149 @@
+import asyncio
+import inspect
+import json
+import time
+import types
+import typing
+from token_utils import count_tokens
+from telemetry import record_request
+from translate_engine import create_async_client, create_completion
+
+# Chat Completions のツール呼び出し（function calling）を処理するループ
+#   ・ToolRegistry にローカル関数を登録し、tools 引数（JSON スキーマ）を作る
+#   ・1回の応答に含まれる tool_calls はすべて並行して実行し、結果をまとめて1回の追加リクエストで返す
+#     （ツール呼び出しが N 個あっても、追加のリクエストは1ターンにつき1回）
+#   ・モデルがツールを呼ばなくなるまで繰り返す（max_rounds を超えたらツールなしで回答させる）
+#   ・ツールごとにタイムアウトを設定できる。失敗・タイムアウトは {"error": ...} としてモデルに返す
+
+# 省略可能な型（Optional[str]。Python 3.10 以降は "str | None" も）
+UNION_TYPES = tuple({typing.Union, getattr(types, "UnionType", typing.Union)})
+
+# Python の型 → JSON スキーマの型
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+              list: "array", dict: "object"}
+
+#======================================================================
+# 関数の引数から JSON スキーマを作る（既定値のない引数は required にする）
+# Optional[str] のような省略可能な型は、None 以外の型を使う。
+def parameters_schema(func):
+    hints = typing.get_type_hints(func)
+    properties = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        annotation = hints.get(name, str)
+        if typing.get_origin(annotation) in UNION_TYPES:
+            annotation = next((a for a in typing.get_args(annotation) if a is not type(None)), str)
+        annotation = typing.get_origin(annotation) or annotation
+        properties[name] = {"type": JSON_TYPES.get(annotation, "string")}
+        if param.default is inspect.Parameter.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+# ツールの戻り値をメッセージの content にする（文字列以外は JSON）
+def tool_content(result):
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+#======================================================================
+class ToolRegistry:
+    def __init__(self, default_timeout=30.0):
+        self.default_timeout = default_timeout
+        self.tools = {}     # 名前 → {"func", "schema", "timeout"}
+
+    # 関数を登録する（デコレーターとしても使える）
+    # description の省略時は docstring の1行目、parameters の省略時は引数の型から作る。
+    def register(self, func=None, *, name=None, description=None, parameters=None, timeout=None):
+        def decorator(func):
+            tool_name = name or func.__name__
+            doc = (inspect.getdoc(func) or "").strip().splitlines()
+            self.tools[tool_name] = {
+                "func": func,
+                "timeout": timeout or self.default_timeout,
+                "schema": {"type": "function", "function": {
+                    "name": tool_name,
+                    "description": description or (doc[0] if doc else ""),
+                    "parameters": parameters or parameters_schema(func),
+                }},
+            }
+            return func
+        return decorator(func) if func else decorator
+
+    # chat.completions.create の tools 引数
+    def schemas(self):
+        return [tool["schema"] for tool in self.tools.values()]
+
+    # ツールを1つ実行し、content の文字列を返す
+    # 同期関数は別スレッドで実行する（タイムアウト後もスレッドは最後まで動くが、結果は使わない）。
+    async def call(self, name, arguments):
+        tool = self.tools.get(name)
+        if tool is None:
+            return tool_content({"error": f"unknown tool: {name}"})
+        started = time.perf_counter()
+        try:
+            kwargs = json.loads(arguments or "{}")
+            if inspect.iscoroutinefunction(tool["func"]):
+                call = tool["func"](**kwargs)
+            else:
+                call = asyncio.to_thread(tool["func"], **kwargs)
+            result = await asyncio.wait_for(call, tool["timeout"])
+        except asyncio.TimeoutError as e:
+            record_request("tool", None, time.perf_counter() - started, error=e, tool=name)
+            return tool_content({"error": f"{name} timed out after {tool['timeout']} seconds"})
+        except Exception as e:
+            record_request("tool", None, time.perf_counter() - started, error=e, tool=name)
+            return tool_content({"error": f"{type(e).__name__}: {e}"})
+        record_request("tool", None, time.perf_counter() - started, tool=name)
+        return tool_content(result)
+
+    # 1回の応答の tool_calls をすべて並行して実行し、tool メッセージのリストを返す（順序は tool_calls と同じ）
+    async def run_calls(self, tool_calls):
+        contents = await asyncio.gather(*(
+            self.call(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls))
+        return [{"role": "tool", "tool_call_id": tool_call.id, "content": content}
+                for tool_call, content in zip(tool_calls, contents)]
+
+#======================================================================
+# 応答メッセージを、次のリクエストに渡す assistant メッセージにする
+def assistant_turn(message):
+    turn = {"role": "assistant", "content": message.content}
+    if message.tool_calls:
+        turn["tool_calls"] = [tool_call.model_dump(exclude_none=True) for tool_call in message.tool_calls]
+    return turn
+
+# リクエストのトークン数の見積もり（RateLimiter の TPM 計算用）
+def estimate_request_tokens(messages, max_tokens=None):
+    return count_tokens(json.dumps(messages, ensure_ascii=False, default=str)) + (max_tokens or 0)
+
+#======================================================================
+# ツール呼び出しのループ
+# messages の後にツール呼び出しと結果を追加しながら、モデルがツールを呼ばなくなるまで繰り返す。
+# max_rounds 回ツールを実行しても終わらない時は、tool_choice="none" で回答させる。
+# (最後の応答, 追加したメッセージを含む messages) を返す。
+async def run_tool_loop(client, model, messages, registry, max_rounds=8, limiter=None, **params):
+    messages = list(messages)
+    rounds = 0
+    while True:
+        request = dict(params, model=model, messages=messages)
+        if registry.tools:
+            request["tools"] = registry.schemas()
+            if rounds >= max_rounds:
+                request["tool_choice"] = "none"
+        response = await create_completion(
+            client, estimate_request_tokens(messages, params.get("max_tokens")), limiter, **request)
+        message = response.choices[0].message
+        if not message.tool_calls or rounds >= max_rounds:
+            return response, messages + [assistant_turn(message)]
+        messages.append(assistant_turn(message))
+        messages.extend(await registry.run_calls(message.tool_calls))
+        rounds += 1
+
+# 同期コードから呼び出すための入口
+def run_tool_loop_sync(api_key, model, messages, registry, **kwargs):
+    async def _main():
+        client = create_async_client(api_key, 0 if kwargs.get("limiter") else 2)
+        try:
+            return await run_tool_loop(client, model, messages, registry, **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(_main())
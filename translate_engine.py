@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+from token_utils import count_tokens
+from segmenter import chunk_text, join_translations, output_token_limit
+from telemetry import record_request, record_response
+
+# 翻訳モデルに渡すシステムプロンプト（逐次処理・並列処理で共通）
+SYSTEM_PROMPT = "You are a translator from Japanese to English."
+
+# 複数の段落をまとめて1リクエストで翻訳する時のシステムプロンプト
+# 各段落に ID を付けて渡し、同じ ID を付けた JSON で返してもらう。
+BATCH_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT + " "
+    "The user sends a JSON object {\"segments\": [{\"id\": ..., \"text\": ...}, ...]}. "
+    "Translate each text independently and reply only with a JSON object "
+    "{\"translations\": [{\"id\": ..., \"text\": ...}, ...]} using the same ids."
+)
+
+# まとめ翻訳で、1段落あたりに加算する JSON の枠のトークン数（概算）
+BATCH_ITEM_OVERHEAD = 8
+
+#======================================================================
+# 並列翻訳用の AsyncOpenAI クライアントを作成する
+# クライアントは1つだけ作り、全リクエストで接続プールを共有する。
+# 再試行を RateLimiter に任せる時は max_retries=0 にする。
+# openai は読み込みに時間がかかるため、クライアントを作る時に import する（起動を速くするため）。
+def create_async_client(api_key, max_retries=2):
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, max_retries=max_retries)
+
+#======================================================================
+# chat.completions.create を呼び出す。limiter があればペース配分と再試行を任せる。
+# tokens はこのリクエストで消費するトークン数の見積もり（TPM の計算用）。
+# 遅延・トークン数・再試行回数は telemetry に記録する（kind="chat"）。
+async def create_completion(client, tokens, limiter=None, **params):
+    stats = {"retries": 0}
+    started = time.perf_counter()
+    try:
+        if limiter:
+            response = await limiter.create_completion(client, tokens, stats, **params)
+        else:
+            response = await client.chat.completions.create(**params)
+    except Exception as e:
+        record_request("chat", params.get("model"), time.perf_counter() - started,
+                       retries=stats["retries"], error=e)
+        raise
+    record_response("chat", params.get("model"), time.perf_counter() - started, response,
+                    retries=stats["retries"])
+    return response
+
+#======================================================================
+# translate_text の非同期版。リクエスト内容は逐次版と同一にする。
+# max_tokens を省略すると、入力のトークン数から決める（segmenter.output_token_limit）。
+async def translate_text_async(client, modelID, text, max_tokens=None, temperature=0.7,
+                               limiter=None, system_prompt=SYSTEM_PROMPT):
+    max_tokens = max_tokens or output_token_limit(text)
+    tokens = count_tokens(system_prompt + text) + max_tokens if limiter else 0
+    response = await create_completion(
+        client, tokens, limiter,
+        model=modelID,
+        messages=[
+            {"role":"system", "content":system_prompt},
+            {"role":"user",   "content":text}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+    return response.choices[0].message.content.strip()
+
+#======================================================================
+# 段落のリストを、1リクエストあたりのトークン数が token_budget 以下になるように
+# 先頭から順に詰めてグループ分けする。各グループは段落の添字のリスト。
+# token_budget を超える長い段落は単独のグループにする。
+def pack_batches(texts, token_budget, max_items=50):
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text) + BATCH_ITEM_OVERHEAD
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+#======================================================================
+# まとめ翻訳の応答（JSON）を解析し、入力と同じ順序の翻訳リストを返す。
+# 解析できなかった段落の位置には None を入れる。
+def parse_batch_reply(content, count):
+    translations = [None] * count
+    try:
+        items = json.loads(content)["translations"]
+    except (ValueError, KeyError, TypeError):
+        return translations
+    for item in items:
+        try:
+            index = int(item["id"])
+            text = item["text"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if 0 <= index < count and isinstance(text, str) and text.strip():
+            translations[index] = text.strip()
+    return translations
+
+#======================================================================
+# 複数の段落を1リクエストで翻訳する
+# 出力トークン上限は入力のトークン数から見積もる。
+async def translate_batch_async(client, modelID, texts, temperature=0.7, limiter=None,
+                                system_prompt=BATCH_SYSTEM_PROMPT):
+    payload = {"segments": [{"id": str(i), "text": text} for i, text in enumerate(texts)]}
+    content = json.dumps(payload, ensure_ascii=False)
+    input_tokens = count_tokens(system_prompt + content)
+    max_tokens = min(4096, 2 * count_tokens(content) + 16 * len(texts))
+    response = await create_completion(
+        client, input_tokens + max_tokens, limiter,
+        model=modelID,
+        messages=[
+            {"role":"system", "content":system_prompt},
+            {"role":"user",   "content":content}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        response_format={"type": "json_object"}
+    )
+    return parse_batch_reply(response.choices[0].message.content, len(texts))
+
+#======================================================================
+# 複数のテキストを同時実行数 concurrency で並列に翻訳する。
+# 結果は完了順に受け取り、入力と同じ順序のリストで返す。
+# 失敗したテキストの位置には例外オブジェクトを入れて返す（呼び出し側で判定する）。
+# token_budget > 0 の時は、短い段落を token_budget 以内でまとめて1リクエストで翻訳し、
+# 応答を解析できなかった段落だけを1件ずつ翻訳し直す。
+# on_result を指定すると、翻訳が1件終わるたびに on_result(添字, 翻訳) を呼ぶ。
+# limiter（RateLimiter）を指定すると、送信ペースの調整と再試行を行い、
+# それでも失敗した段落は最大 retry_rounds 回まで1件ずつ再投入する。
+# 複数の文書を同時に翻訳する時は、semaphore を共有して全体の同時実行数を抑える。
+# matcher（glossary.GlossaryMatcher）を指定すると、段落に含まれる用語の対訳をプロンプトに加える。
+# max_chunk_tokens > 0 の時は、それより長い段落を文の区切りで分けて並列に翻訳し、つなげて1つの結果にする
+# （段落の翻訳にかかる時間が、一番長い断片の翻訳時間程度になる。断片が1つでも失敗すれば段落全体を失敗とする）。
+async def translate_all(client, modelID, texts, concurrency=8, token_budget=0,
+                        max_tokens=None, temperature=0.7, on_result=None,
+                        limiter=None, retry_rounds=0, semaphore=None, desc=None,
+                        matcher=None, max_chunk_tokens=0):
+    from tqdm import tqdm
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+    if max_chunk_tokens > 0:
+        plans = [chunk_text(text, max_chunk_tokens) for text in texts]
+        if any(len(chunks) > 1 for chunks in plans):
+            return await _translate_chunked(client, modelID, plans, on_result, semaphore=semaphore,
+                                            token_budget=token_budget, max_tokens=max_tokens,
+                                            temperature=temperature, limiter=limiter,
+                                            retry_rounds=retry_rounds, desc=desc, matcher=matcher)
+    results = [None] * len(texts)
+    if token_budget > 0:
+        batches = pack_batches(texts, token_budget)
+    else:
+        batches = [[i] for i in range(len(texts))]
+
+    def set_result(index, translated):
+        results[index] = translated
+        if on_result and not isinstance(translated, Exception):
+            on_result(index, translated)
+
+    def prompt_for(text, base_prompt):
+        return matcher.system_prompt(text, base_prompt) if matcher else base_prompt
+
+    async def translate_one(index):
+        try:
+            set_result(index, await translate_text_async(
+                client, modelID, texts[index], max_tokens, temperature, limiter,
+                prompt_for(texts[index], SYSTEM_PROMPT)))
+        except Exception as e:
+            set_result(index, e)
+
+    async def worker(indices):
+        async with semaphore:
+            if len(indices) == 1:
+                await translate_one(indices[0])
+                return 1
+            batch_texts = [texts[i] for i in indices]
+            try:
+                translations = await translate_batch_async(
+                    client, modelID, batch_texts, temperature, limiter,
+                    prompt_for("\n".join(batch_texts), BATCH_SYSTEM_PROMPT))
+            except Exception:
+                translations = [None] * len(indices)
+            for index, translated in zip(indices, translations):
+                if translated is None:
+                    await translate_one(index)
+                else:
+                    set_result(index, translated)
+            return len(indices)
+
+    tasks = [asyncio.create_task(worker(indices)) for indices in batches]
+    with tqdm(total=len(texts), desc=desc) as pbar:
+        for task in asyncio.as_completed(tasks):
+            pbar.update(await task)
+        for _ in range(retry_rounds):
+            failed = [i for i, result in enumerate(results) if isinstance(result, Exception)]
+            if not failed:
+                break
+            pbar.write(f"再投入: {len(failed)} 段落")
+            await asyncio.gather(*(worker([i]) for i in failed))
+    return results
+
+#======================================================================
+# 分割した断片をまとめて translate_all で翻訳し、段落ごとにつなげて返す
+# plans は段落ごとの断片のリスト（chunk_text の結果）。
+# on_result は段落の断片がすべて揃った時に、段落の添字で呼ぶ。
+async def _translate_chunked(client, modelID, plans, on_result=None, **kwargs):
+    pieces = []
+    owners = []
+    for index, chunks in enumerate(plans):
+        pieces += chunks
+        owners += [index] * len(chunks)
+    starts = [0]
+    for chunks in plans:
+        starts.append(starts[-1] + len(chunks))
+    remaining = [len(chunks) for chunks in plans]
+    piece_results = [None] * len(pieces)
+
+    def joined(index):
+        translated = piece_results[starts[index]:starts[index + 1]]
+        errors = [t for t in translated if isinstance(t, Exception)]
+        return errors[0] if errors else join_translations(plans[index], translated)
+
+    def on_piece(k, translated):
+        piece_results[k] = translated
+        index = owners[k]
+        remaining[index] -= 1
+        if remaining[index] == 0 and on_result:
+            on_result(index, joined(index))
+
+    piece_results = await translate_all(client, modelID, pieces, on_result=on_piece, **kwargs)
+    return [joined(index) for index in range(len(plans))]
+
+#======================================================================
+# 同期コードから呼び出すための入口。
+# イベントループの開始から終了までの間だけクライアントを生かしておく。
+def run_translate_all(api_key, modelID, texts, concurrency=8, **kwargs):
+    async def _main():
+        client = create_async_client(api_key, 0 if kwargs.get("limiter") else 2)
+        try:
+            return await translate_all(client, modelID, texts, concurrency, **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(_main())
@@ -0,0 +1,113 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+import unicodedata
+from translate_engine import SYSTEM_PROMPT
+
+#======================================================================
+# キャッシュのキーに使うため、日本語テキストを正規化する
+# 全角/半角の揺れ（NFKC）と空白の違いを吸収する。
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+#======================================================================
+# 翻訳メモリ（SQLite）
+# モデルID・システムプロンプト・temperature・正規化後の原文をキーとして、
+# 翻訳結果をディスクに保存する。件数が max_entries を超えたら、
+# 最後に使われた日時が古いものから削除する（LRU）。
+class TranslationCache:
+    def __init__(self, path, max_entries=200000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key         TEXT PRIMARY KEY,
+                model       TEXT NOT NULL,
+                source      TEXT NOT NULL,
+                translated  TEXT NOT NULL,
+                last_used   REAL NOT NULL
+            )""")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_model ON translations(model)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(modelID, text, temperature=0.7, system_prompt=SYSTEM_PROMPT):
+        raw = json.dumps([modelID, system_prompt, temperature, normalize_text(text)],
+                         ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # キャッシュにあれば翻訳結果を返し、無ければ None を返す
+    def get(self, modelID, text, temperature=0.7, system_prompt=SYSTEM_PROMPT):
+        key = self.make_key(modelID, text, temperature, system_prompt)
+        row = self.conn.execute(
+            "SELECT translated FROM translations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    # 1件ごとにコミットする（途中で強制終了しても、それまでの翻訳は残る）
+    # get() の last_used の更新も、ここでまとめてコミットされる。
+    def put(self, modelID, text, translated, temperature=0.7, system_prompt=SYSTEM_PROMPT):
+        key = self.make_key(modelID, text, temperature, system_prompt)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+            (key, modelID, normalize_text(text), translated, time.time()))
+        self.conn.commit()
+
+    # 新しいファインチューニングモデルに置き換えた時など、
+    # 指定モデルのエントリをまとめて削除する。削除件数を返す。
+    def invalidate_model(self, modelID):
+        cur = self.conn.execute("DELETE FROM translations WHERE model = ?", (modelID,))
+        self.conn.commit()
+        return cur.rowcount
+
+    # 件数が上限を超えていれば、古いものから削除する。削除件数を返す。
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self.conn.execute("""
+            DELETE FROM translations WHERE key IN (
+                SELECT key FROM translations ORDER BY last_used LIMIT ?
+            )""", (excess,))
+        self.conn.commit()
+        return excess
+
+    def stats(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        return {"entries": count, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+# 翻訳メモリのメンテナンス用
+#   python translation_cache.py translation_memory.sqlite3 --stats
+#   python translation_cache.py translation_memory.sqlite3 --invalidate ft:gpt-3.5-turbo-0125:...
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--invalidate", metavar="MODEL_ID")
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    cache = TranslationCache(args.path)
+    if args.invalidate:
+        print("削除件数:", cache.invalidate_model(args.invalidate))
+    if args.stats:
+        print(cache.stats())
+    cache.close()
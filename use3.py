@@ -1,69 +1,40 @@
-from openai import OpenAI
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from tool_loop import ToolRegistry, run_tool_loop_sync
 
 # APIキーを環境変数から取得（Service Account のキー）
 load_dotenv()
 api_key = os.getenv("API_9519-01_TRY")  # Service Account の APIキー
 
-client = OpenAI(api_key=api_key)
-
-# ツール（関数）の定義
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_time",
-            "description": "現在の時刻を返します",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": [],
-            }
-        }
-    }
-]
+# ツール（関数）の登録
+# 1回の応答で複数のツールが呼ばれた場合は並行して実行し、結果をまとめて1回のリクエストで返す（tool_loop.py）
+tools = ToolRegistry(default_timeout=10)
 
 # 実際のツール実装（ローカル処理）
+@tools.register
 def get_current_time():
+    """現在の時刻を返します"""
     now = datetime.now().isoformat()
     return {"current_time": now}
 
-# チャットの実行（Tool callのトリガー）
-response = client.chat.completions.create(
-    model="gpt-4",
-    messages=[
-        {"role": "user", "content": "今何時？"}
-    ],
-    tools=tools,
-    tool_choice="auto"  # ツールが必要なときだけ呼び出す
+@tools.register
+def get_weekday(date: str):
+    """指定した日付（YYYY-MM-DD）の曜日を返します"""
+    return {"date": date, "weekday": "月火水木金土日"[datetime.fromisoformat(date).weekday()]}
+
+# チャットの実行（ツールが必要なときだけ呼び出し、呼ばなくなるまで繰り返す）
+response, messages = run_tool_loop_sync(
+    api_key,
+    "gpt-4",
+    [{"role": "user", "content": "今何時？今日は何曜日？"}],
+    tools,
+    tool_choice="auto",
 )
 
-# ツール呼び出しの検出と実行
-tool_calls = response.choices[0].message.tool_calls
-
-if tool_calls:
-    for tool_call in tool_calls:
-        function_name = tool_call.function.name
-        if function_name == "get_current_time":
-            result = get_current_time()
-
-            # ツールレスポンスをメッセージとして送る
-            second_response = client.chat.completions.create(
-                model="gpt-4-0613",
-                messages=[
-                    {"role": "user", "content": "今何時？"},
-                    response.choices[0].message,
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": function_name,
-                        "content": str(result),
-                    }
-                ]
-            )
-
-            print("Assistant response:", second_response.choices[0].message.content)
+tool_results = [m for m in messages if m["role"] == "tool"]
+if tool_results:
+    print(f"Tool calls: {len(tool_results)}")
 else:
     print("Tool call was not triggered.")
+print("Assistant response:", response.choices[0].message.content)
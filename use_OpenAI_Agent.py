@@ -1,10 +1,19 @@
-from agents import FileSearchTool, WebSearchTool, CodeInterpreterTool, Agent, ModelSettings, TResponseInputItem, Runner, RunConfig, trace
+from agents import FileSearchTool, WebSearchTool, CodeInterpreterTool, Agent, ModelSettings, Runner, RunConfig, trace, custom_span, function_tool
 from pydantic import BaseModel
 from openai.types.shared.reasoning import Reasoning
 import asyncio
-from openai import OpenAI
 import os
+import time
+import json
+import configparser
+import functools
+from datetime import date
+from typing import Optional
+from pathlib import Path
 from dotenv import load_dotenv
+import telemetry
+from conversation_state import ConversationState, result_items, user_message
+from estimate_query import load_estimate_table_from_config
 
 
 
@@ -29,6 +38,42 @@ code_interpreter = CodeInterpreterTool(tool_config={
     ]
   }
 })
+
+
+
+# 見積データの集計エンジン（estimate_query.py）。最初に呼ばれた時に読み込む。
+@functools.lru_cache(maxsize=1)
+def estimate_table():
+  config = configparser.ConfigParser()
+  base_dir = Path(__file__).resolve().parent
+  with open(base_dir / 'config.ini', 'r', encoding='utf-8') as f:
+    config.read_file(f)
+  return load_estimate_table_from_config(config, base_dir)
+
+
+@function_tool
+def query_estimates(operation: str, field: Optional[str] = None, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None, customer: Optional[str] = None,
+                    keyword: Optional[str] = None, top_k: int = 5) -> str:
+  """見積データ（estimate_data.json）を条件で絞り込み、正確に集計する。合計・平均・件数・上位k件の質問に使う。
+
+  Args:
+    operation: "top"（field の大きい順に top_k 件）/ "sum"（合計）/ "avg"（平均）/ "count"（件数）
+    field: 集計・並べ替えに使う数値項目（例: 金額, 粗利額）。count では不要
+    date_from: 期間の開始日 YYYY-MM-DD（その日を含む）
+    date_to: 期間の終了日 YYYY-MM-DD（その日を含む）
+    customer: 顧客名（部分一致）
+    keyword: 案件名（部分一致）
+    top_k: top の件数
+  """
+  try:
+    result = estimate_table().query(operation, field, date_from, date_to, customer, keyword, top_k)
+  except (OSError, ValueError) as e:
+    return json.dumps({"error": str(e)}, ensure_ascii=False)
+  result["today"] = date.today().isoformat()
+  return json.dumps(result, ensure_ascii=False)
+
+
 class ClassifySchema(BaseModel):
   operating_procedure: str
 
@@ -68,11 +113,13 @@ internal_q_a = Agent(
   name="Internal Q&A",
   instructions="""-- Est_vector storeの中のestimate_data.jsonには、これまでに作成された見積の情報が入っている。
 -- 特に指定が無い場合、estimate_data.jsonの{} で囲まれた１つのオブジェクトを、１つの見積の情報として認識する。
--- 回答前に必ず File search で関連情報を探す。
+-- 数値の「合計・平均・件数・上位○件」などの集計は、必ず query_estimates で行う（File search で数えない）。「昨年」などの期間は結果の today を基準に日付へ直す。
+-- それ以外の質問は、回答前に必ず File search で関連情報を探す。
 -- 必要に応じて見つかった根拠（見積番号/顧客名/案件名/日付/金額など）を回答に含める
--- 数値の「合計・平均・件数」などの厳密集計は、根拠に含まれる範囲を明示し、曖昧なら「集計条件」を確認する""",
+-- 集計結果には、使った「集計条件」（期間・顧客・案件名・対象件数）を明示する""",
   model="gpt-5",
   tools=[
+    query_estimates,
     file_search
   ],
   model_settings=ModelSettings(
@@ -124,142 +171,276 @@ class WorkflowInput(BaseModel):
   input_as_text: str
 
 
-# Main code entrypoint
-async def run_workflow(workflow_input: WorkflowInput):
-  with trace("Est_agent"):
-    state = {
+# run_workflow の結果
+#   route: 回答したエージェントの表示名 / speculative: 投機実行の分類が当たったか（"hit" / "miss"、逐次実行は None）
+#   ttft: ストリーミング時、開始から最初の差分を渡すまでの秒数
+class WorkflowOutput(BaseModel):
+  output_text: str
+  route: str
+  speculative: Optional[str] = None
+  ttft: Optional[float] = None
+
+
+# Runner.run を呼び出し、遅延・トークン数を telemetry に記録する（kind="agent"）
+async def run_agent(agent, **kwargs):
+  started = time.perf_counter()
+  try:
+    result = await Runner.run(agent, **kwargs)
+  except Exception as e:
+    telemetry.record_request("agent", agent.model, time.perf_counter() - started, error=e, agent=agent.name)
+    raise
+  usage = result.context_wrapper.usage
+  telemetry.record_request("agent", agent.model, time.perf_counter() - started,
+                           usage.input_tokens, usage.output_tokens,
+                           agent=agent.name, api_requests=usage.requests)
+  return result
+
+
+# ストリーミングで受け取るイベントと、consumer に渡す差分の種類
+STREAM_DELTA_KINDS = {
+  "response.reasoning_summary_text.delta": "reasoning",
+  "response.output_text.delta": "answer",
+}
+
+
+# Runner.run_streamed で実行し、推論の要約・回答の差分を届いた順に on_delta(kind, text) へ渡す
+# 結果（final_output 等）は Runner.run と同じ。取り消された時は実行中の API 呼び出しも止める。
+async def run_agent_streamed(agent, on_delta, **kwargs):
+  started = time.perf_counter()
+  first_delta = None
+  result = Runner.run_streamed(agent, **kwargs)
+  try:
+    async for event in result.stream_events():
+      if event.type != "raw_response_event":
+        continue
+      kind = STREAM_DELTA_KINDS.get(event.data.type)
+      if kind and event.data.delta:
+        if first_delta is None:
+          first_delta = time.perf_counter() - started
+        await on_delta(kind, event.data.delta)
+  except asyncio.CancelledError:
+    result.cancel()
+    raise
+  except Exception as e:
+    telemetry.record_request("agent", agent.model, time.perf_counter() - started, error=e, agent=agent.name)
+    raise
+  usage = result.context_wrapper.usage
+  telemetry.record_request("agent", agent.model, time.perf_counter() - started,
+                           usage.input_tokens, usage.output_tokens,
+                           agent=agent.name, api_requests=usage.requests, ttft=first_delta)
+  return result
+
+
+# 回答エージェントの差分を consumer に渡す中継
+#   ・最初の差分を渡した時点で、ワークフロー開始からの時間（TTFT）をトレースに記録する
+#   ・hold() の間は差分を溜め、release() でまとめて渡す（投機実行で分類が確定するまで）
+#     discard() は溜めた差分を捨てる（予測が外れて回答をやり直す時）
+class DeltaRelay:
+  def __init__(self, consumer, started):
+    self.consumer = consumer
+    self.started = started
+    self.held = None
+    self.ttft = None
+
+  async def __call__(self, kind, text):
+    if self.held is not None:
+      self.held.append((kind, text))
+      return
+    await self._emit(kind, text)
+
+  async def _emit(self, kind, text):
+    if self.ttft is None:
+      self.ttft = time.perf_counter() - self.started
+      with custom_span("time_to_first_token", data={"seconds": round(self.ttft, 3)}):
+        pass
+    await self.consumer(kind, text)
+
+  def hold(self):
+    self.held = []
+
+  async def release(self):
+    # 渡している間に届いた差分も順に渡してから、そのまま渡す状態に戻す
+    while self.held:
+      await self._emit(*self.held.pop(0))
+    self.held = None
+
+  def discard(self):
+    self.held = None
+
+
+# コンソールに差分を表示する consumer（種類が変わる時に見出しを付ける）
+class ConsoleStream:
+  HEADERS = {"reasoning": "\n[推論の要約]\n", "answer": "\n[回答]\n"}
+
+  def __init__(self):
+    self.kind = None
+
+  async def __call__(self, kind, text):
+    if kind != self.kind:
+      print(self.HEADERS.get(kind, ""), end="", flush=True)
+      self.kind = kind
+    print(text, end="", flush=True)
+
+
+def workflow_run_config():
+  return RunConfig(trace_metadata={
+    "__trace_source__": "agent-builder",
+    "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
+  })
+
+
+# 段階ごとの入力トークン数の上限（省略したエージェントは ConversationState の token_budget）
+# 分類・書き換えには現在の質問と直近の経過だけあれば足りる。
+STAGE_TOKEN_BUDGETS = {
+  "Classify": 1500,
+  "Query rewrite": 3000,
+}
+
+
+# 分類結果から、回答に使うエージェントと表示名を選ぶ
+def select_branch(operating_procedure):
+  if operating_procedure == "q-and-a":
+    return internal_q_a, "Internal Q&A"
+  if operating_procedure == "fact-finding":
+    return external_fact_finding, "Fact Finding"
+  return agent, "General"
+
+
+# on_delta を渡すとストリーミングで実行する（run_agent_streamed）
+async def run_stage(stage_agent, state, *extra, on_delta=None):
+  kwargs = dict(
+    input=state.input_items(*extra, budget=STAGE_TOKEN_BUDGETS.get(stage_agent.name)),
+    run_config=workflow_run_config(),
+    **state.run_kwargs()
+  )
+  if on_delta is None:
+    return await run_agent(stage_agent, **kwargs)
+  return await run_agent_streamed(stage_agent, on_delta, **kwargs)
+
+
+async def rewrite_query(state, text):
+  return await run_stage(query_rewrite, state, user_message(f"Original question: {text}"))
+
+
+async def classify_question(state, question):
+  return await run_stage(classify, state, user_message(f"Question: {question}"))
+
+
+async def answer_question(branch_agent, state, *extra, on_delta=None):
+  return await run_stage(branch_agent, state, *extra, on_delta=on_delta)
+
+
+# 投機実行
+#   1. 書き換え（query_rewrite）と、元の質問の分類（classify）を同時に実行する
+#   2. 分類結果から選んだ回答エージェントを、書き換えが終わり次第すぐに開始する
+#   3. 同時に書き換え後の質問で分類し直し、結果が違えば回答を取り消して正しいエージェントで回答し直す
+# 予測が当たれば、逐次実行より分類1回分（モデル1往復分）早く回答が得られる。
+# 予測が外れた場合の回答エージェントへの入力は、逐次実行と同じになる。
+# relay（DeltaRelay）を渡すとストリーミングで回答する。予測した回答の差分は分類が確定するまで溜めておき、
+# 外れた場合は捨てる（外れた回答は表示しない）。
+# (結果, 表示名, "hit" / "miss") を返す。
+async def run_speculative(state, text, relay=None):
+  rewrite_task = asyncio.create_task(rewrite_query(state, text))
+  guess_task = asyncio.create_task(classify_question(state, text))
+  tasks = [rewrite_task, guess_task]
+  try:
+    guess_result = await guess_task
+    rewrite_result = await rewrite_task
+    state.add_result(rewrite_result)
+    guess = guess_result.final_output.operating_procedure
+    branch_agent, label = select_branch(guess)
+    if relay:
+      relay.hold()
+    answer_task = asyncio.create_task(answer_question(
+      branch_agent, state, *result_items(guess_result), on_delta=relay))
+    verify_task = asyncio.create_task(classify_question(
+      state, rewrite_result.final_output_as(str)))
+    tasks += [answer_task, verify_task]
+
+    verify_result = await verify_task
+    verified = verify_result.final_output.operating_procedure
+    if select_branch(verified)[0] is branch_agent:
+      if relay:
+        await relay.release()
+      return await answer_task, label, "hit"
+
+    answer_task.cancel()
+    if relay:
+      relay.discard()
+    branch_agent, label = select_branch(verified)
+    answer_task = asyncio.create_task(answer_question(
+      branch_agent, state, *result_items(verify_result), on_delta=relay))
+    tasks.append(answer_task)
+    return await answer_task, label, "miss"
+  finally:
+    for task in tasks:
+      if not task.done():
+        task.cancel()
+
 
-    }
+# Main code entrypoint
+# speculative=True の時は、書き換えと分類を並行して実行する（run_speculative）。
+# state（ConversationState）を渡すと、複数ターンの会話として前のターンの質問・回答を引き継ぐ。
+# group_id / metadata はトレースに付ける（サービスとして動かす時の会話ID・リクエストIDなど）。
+# on_delta(kind, text) を渡すと、回答エージェントをストリーミングで実行し、推論の要約（kind="reasoning"）と
+# 回答（kind="answer"）の差分を届いた順に渡す。書き換え・分類は従来どおり実行し、最終的な回答は変わらない。
+async def run_workflow(workflow_input: WorkflowInput, speculative=False, state=None,
+                       group_id=None, metadata=None, on_delta=None) -> WorkflowOutput:
+  if state is None:
+    state = ConversationState()
+  relay = DeltaRelay(on_delta, time.perf_counter()) if on_delta else None
+  with trace("Est_agent", group_id=group_id, metadata=metadata):
     workflow = workflow_input.model_dump()
-    conversation_history: list[TResponseInputItem] = [
-      {
-        "role": "user",
-        "content": [
-          {
-            "type": "input_text",
-            "text": workflow["input_as_text"]
-          }
-        ]
-      }
-    ]
-    query_rewrite_result_temp = await Runner.run(
-      query_rewrite,
-      input=[
-        *conversation_history,
-        {
-          "role": "user",
-          "content": [
-            {
-              "type": "input_text",
-              "text": f"Original question: {workflow['input_as_text']}"
-            }
-          ]
-        }
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
-      })
-    )
+    state.start_turn(workflow["input_as_text"])
+    outcome = None
+    if speculative:
+      result, label, outcome = await run_speculative(state, workflow["input_as_text"], relay)
+    else:
+      query_rewrite_result_temp = await rewrite_query(state, workflow["input_as_text"])
+      state.add_result(query_rewrite_result_temp)
 
-    conversation_history.extend([item.to_input_item() for item in query_rewrite_result_temp.new_items])
-
-    query_rewrite_result = {
-      "output_text": query_rewrite_result_temp.final_output_as(str)
-    }
-    classify_result_temp = await Runner.run(
-      classify,
-      input=[
-        *conversation_history,
-        {
-          "role": "user",
-          "content": [
-            {
-              "type": "input_text",
-              "text": f"Question: {query_rewrite_result['output_text']}"
-            }
-          ]
-        }
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
-      })
-    )
+      classify_result_temp = await classify_question(
+        state, query_rewrite_result_temp.final_output_as(str))
+      state.add_result(classify_result_temp)
 
-    conversation_history.extend([item.to_input_item() for item in classify_result_temp.new_items])
-
-    classify_result = {
-      "output_text": classify_result_temp.final_output.model_dump_json(),
-      "output_parsed": classify_result_temp.final_output.model_dump()
-    }
-    if classify_result["output_parsed"]["operating_procedure"] == "q-and-a":
-      internal_q_a_result_temp = await Runner.run(
-        internal_q_a,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
-        })
-      )
-
-      conversation_history.extend([item.to_input_item() for item in internal_q_a_result_temp.new_items])
-
-      internal_q_a_result = {
-        "output_text": internal_q_a_result_temp.final_output_as(str)
-      }
-      print("\n===== AGENT ANSWER (Internal Q&A) =====")
-      print(internal_q_a_result["output_text"])
-
-    elif classify_result["output_parsed"]["operating_procedure"] == "fact-finding":
-      external_fact_finding_result_temp = await Runner.run(
-        external_fact_finding,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
-        })
-      )
-
-      conversation_history.extend([item.to_input_item() for item in external_fact_finding_result_temp.new_items])
-
-      external_fact_finding_result = {
-        "output_text": external_fact_finding_result_temp.final_output_as(str)
-      }
-      print("\n===== AGENT ANSWER (Fact Finding) =====")
-      print(external_fact_finding_result["output_text"])
+      branch_agent, label = select_branch(classify_result_temp.final_output.operating_procedure)
+      result = await answer_question(branch_agent, state, on_delta=relay)
 
-    else:
-      agent_result_temp = await Runner.run(
-        agent,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_695b3a7c1088819089e10d3a1da1beb709765ecff1b69251"
-        })
-      )
-
-      conversation_history.extend([item.to_input_item() for item in agent_result_temp.new_items])
-
-      agent_result = {
-        "output_text": agent_result_temp.final_output_as(str)
-      }
-      print("\n===== AGENT ANSWER (General) =====")
-      print(agent_result["output_text"])
+    output_text = result.final_output_as(str)
+    state.end_turn(output_text, result)
+    return WorkflowOutput(output_text=output_text, route=label, speculative=outcome,
+                          ttft=relay.ttft if relay else None)
 
 if __name__ == "__main__":
     # APIキーを環境変数から取得（Service Account のキー）
     load_dotenv()
     os.environ["OPENAI_API_KEY"] = os.getenv("API_9519-01_TRY")
 
+    # API 呼び出しの計測結果を [telemetry] dir の agent.jsonl / agent.prom に書き出す
+    config = configparser.ConfigParser()
+    BASE_DIR = Path(__file__).resolve().parent
+    with open(BASE_DIR / 'config.ini', 'r', encoding='utf-8') as f:
+      config.read_file(f)
+    telemetry.configure_from_config(config, BASE_DIR, "agent")
+
     user_input = WorkflowInput(
         input_as_text="昨年行われた見積の中で粗利額が大きいものを5つ抽出して。"
     )
 
-    asyncio.run(run_workflow(user_input))
\ No newline at end of file
+    # [agent] speculative = yes の時は、書き換えと分類を並行して実行する
+    speculative = config.getboolean('agent', 'speculative', fallback=False)
+    # 会話履歴のトークン数上限と、前のターンを response id で参照するか（[agent] history_token_budget / response_chaining）
+    state = ConversationState(config.getint('agent', 'history_token_budget', fallback=4000),
+                              config.getboolean('agent', 'response_chaining', fallback=False))
+    # [agent] streaming = yes の時は、回答を届いた順に表示する
+    streaming = config.getboolean('agent', 'streaming', fallback=False)
+    output = asyncio.run(run_workflow(user_input, speculative=speculative, state=state,
+                                      on_delta=ConsoleStream() if streaming else None))
+    if output.speculative:
+      print(f"\n投機実行: {'的中' if output.speculative == 'hit' else '外れ（回答し直し）'}")
+    if streaming:
+      print(f"\n===== AGENT ANSWER ({output.route}, 最初の表示まで {output.ttft or 0:.2f} 秒) =====")
+    else:
+      print(f"\n===== AGENT ANSWER ({output.route}) =====")
+      print(output.output_text)
+    telemetry.finish()
\ No newline at end of file
@@ -1,79 +1,78 @@
 import os
-from openai import OpenAI
-from docx import Document
+import sys
 #from docx.oxml.text.paragraph import CT_P
 #from docx.oxml.table import CT_Tc
-import tiktoken
-from tqdm import tqdm
 from dotenv import load_dotenv
+import argparse
 import configparser
 import logging
+import multiprocessing
+import time
 from pathlib import Path
+from translate_engine import SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT, run_translate_all
+from segmenter import chunk_text, join_translations, output_token_limit
+from translation_cache import TranslationCache
+from docx_stream import extract_paragraphs, write_translations
+from glossary import load_glossary, load_glossary_matcher
+from fast_path import FastPath
+from incremental import load_previous_pairs, align_with_previous
+from multi_translate import resolve_inputs, run_translate_documents
+from rate_limiter import RateLimiter
+from journal import TranslationJournal, file_hash
+from docx_utils import collect_targets, group_segments, replace_text_preserve_styles, uniquify
+import telemetry
+
+# openai・docx（python-docx）・tqdm は読み込みに時間がかかるため、使う処理の中で import する。
+# 翻訳メモリ・ローカル変換だけで済む時や --help では読み込まない（起動を速くするため）。
 
 #======================================================================
 # 指定の翻訳モデルを使って、日本語テキストを英語に翻訳する
-def translate_text(client, modelID, text, max_tokens=300, temperature=0.7):
-    response = client.chat.completions.create(
-        model=modelID,
-        messages=[
-            {"role":"system", "content":"You are a translator from Japanese to English."},
-            {"role":"user",   "content":text}
-        ],
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
+# 遅延・トークン数は telemetry に記録する。
+# max_tokens を省略すると、入力のトークン数から決める（segmenter.output_token_limit）。
+def translate_text(client, modelID, text, max_tokens=None, temperature=0.7, system_prompt=SYSTEM_PROMPT):
+    max_tokens = max_tokens or output_token_limit(text)
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model=modelID,
+            messages=[
+                {"role":"system", "content":system_prompt},
+                {"role":"user",   "content":text}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    except Exception as e:
+        telemetry.record_request("chat", modelID, time.perf_counter() - started, error=e)
+        raise
+    telemetry.record_response("chat", modelID, time.perf_counter() - started, response)
     return response.choices[0].message.content.strip()
 
-#======================================================================
-# Word文書（Document）から、本文とすべての表内段落を順に取り出す
-def iter_paragraphs(doc):
-    for para in doc.paragraphs:
-        yield para
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    yield para
-
-#======================================================================
-# 段落内の日本語テキストを、英語翻訳テキストに置き換える。
-# 元の runs（書式）を可能な限り維持する。
-def replace_text_preserve_styles(paragraph, new_text):
-    full_text = paragraph.text
-    if not full_text.strip():
-        return
-    if len(full_text) != len(new_text):
-        # 長さが変わる時は runs に分解して置換
-        # 簡略化のため、一度空runsクリアして全体追加
-        for run in paragraph.runs:
-            run.text = ""
-        paragraph.add_run(new_text)
-    else:
-        # 長さが同じなら runsごとに直接置換
-        idx = 0
-        for run in paragraph.runs:
-            run_len = len(run.text)
-            run.text = new_text[idx:idx+run_len]
-            idx += run_len
-
-#======================================================================
-# 指定のパスが既に存在する場合、自動で連番を追加して一意のファイル名を生成する
-def uniquify(path):
-    """
-    指定された path が存在しなければそのまま返す。
-    存在する場合、"filename (2).ext", "filename (3).ext", ... のようにして
-    存在しない最初の名前を返す。
-    """
-    filename, extension = os.path.splitext(path)
-    counter = 1
-    new_path = path
-    while os.path.exists(new_path):
-        new_path = f"{filename} ({counter}){extension}"
-        counter += 1
-    return new_path
-
 # Example usage
 if __name__ == "__main__":
+    # PyInstaller の実行ファイル（build_exe.py）では、複数文書モードのプロセスプールの子プロセスが
+    # この入口を再実行しないよう、最初に呼ぶ（Windows で必要。それ以外では何もしない）
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="*",
+                        help="翻訳する .docx・フォルダ・glob パターン（省略時は config.ini の word_jp）")
+    parser.add_argument("--output-dir", default=None,
+                        help="出力先（省略時は各文書と同じフォルダ）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="複数文書モードで文書を解析するプロセス数（省略時は CPU 数）")
+    parser.add_argument("--resume", action="store_true",
+                        help="前回中断した翻訳をジャーナルから読み戻し、残りの段落だけを翻訳する")
+    parser.add_argument("--prev-source", default=None,
+                        help="前版の原文 .docx（--prev-translated と一緒に指定すると、変更された段落だけを翻訳する）")
+    parser.add_argument("--prev-translated", default=None,
+                        help="前版の翻訳結果 .docx")
+    parser.add_argument("--config", default=None,
+                        help="設定ファイル（省略時はこのスクリプトと同じフォルダの config.ini）")
+    args = parser.parse_args()
+    # ジャーナル・前版との差分は1文書（config.ini の word_jp）の翻訳にだけ使える
+    if args.inputs and (args.resume or args.prev_source or args.prev_translated):
+        parser.error("--resume / --prev-source / --prev-translated は、文書を引数で指定する複数文書モードでは使えません")
+
     # Configure the logger
     logging.basicConfig(
         filename='use.log',              # Output log file
@@ -81,48 +80,262 @@ if __name__ == "__main__":
         level=logging.DEBUG,             # Log level (use INFO or WARNING for less verbosity)
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
-    logging.warning('Warning message')
-    logging.error('Error message')
 
     load_dotenv()
 
     # Create a ConfigParser object
     config = configparser.ConfigParser()
-    BASE_DIR = Path(__file__).resolve().parent
-    with open(BASE_DIR / 'config.ini', 'r', encoding='utf-8') as f:
+    # PyInstaller でまとめた実行ファイルでは、実行ファイルと同じフォルダの config.ini 等を使う
+    if getattr(sys, "frozen", False):
+        BASE_DIR = Path(sys.executable).resolve().parent
+    else:
+        BASE_DIR = Path(__file__).resolve().parent
+    with open(args.config or BASE_DIR / 'config.ini', 'r', encoding='utf-8') as f:
         config.read_file(f)
 
+    # API 呼び出しの計測結果を [telemetry] dir の translate.jsonl / translate.prom に書き出す
+    telemetry.configure_from_config(config, BASE_DIR, "translate")
+
     input_path =  BASE_DIR / config['input']['word_jp']
-    output_path =  BASE_DIR / f"output_{os.path.basename(input_path)}"
+    output_path =  Path(args.output_dir or BASE_DIR) / f"output_{os.path.basename(input_path)}"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     output_path = uniquify(output_path)
-    doc = Document(input_path)
-    doc.save(output_path)
-    out = Document(output_path)
+    # stream: document.xml だけを逐次処理する軽量エンジン / python-docx: 従来の処理
+    docx_engine = config.get('docx', 'engine', fallback='python-docx')
     env_key = "API_9519-01_TRY"
-    client = OpenAI(api_key=os.getenv(env_key))
 
     env_model_id = "API_9519-01_TRY_MODEL"
     modelID = os.getenv(env_model_id)
 
-    for para in tqdm(list(iter_paragraphs(out))):
-        text = para.text.strip()
-        if not text:
-            continue
-        try:
-            print("===========================", env_key, " : ",env_model_id)
-            print("【原文】" + text)
+    # 同時実行数。1 の場合は従来どおり1段落ずつ逐次翻訳する。
+    concurrency = config.getint('translate', 'concurrency', fallback=1)
+    # まとめ翻訳の1リクエストあたりのトークン数上限。0 の場合はまとめない。
+    token_budget = config.getint('translate', 'batch_token_budget', fallback=0)
+    # これより長い段落は文の区切りで分けて並列に翻訳する。0 の場合は分けない。
+    max_chunk_tokens = config.getint('translate', 'max_chunk_tokens', fallback=0)
+    # RPM・TPM に合わせた送信ペースの調整と、失敗時の再試行・再投入
+    limiter = None
+    retry_rounds = 0
+    if config.getboolean('rate_limit', 'enabled', fallback=False):
+        limiter = RateLimiter(config.getint('rate_limit', 'rpm'),
+                              config.getint('rate_limit', 'tpm'),
+                              max_retries=config.getint('rate_limit', 'max_retries', fallback=6))
+        retry_rounds = config.getint('rate_limit', 'retry_rounds', fallback=3)
+    # 翻訳メモリのキーには、実際に使うシステムプロンプトを含める
+    prompt = BATCH_SYSTEM_PROMPT if token_budget > 0 else SYSTEM_PROMPT
+
+    # 日英対照表の用語照合。inject: 段落に含まれる用語の対訳をプロンプトに加える /
+    # verify: 翻訳結果に対訳の英語表現が含まれているかを確認する
+    matcher = None
+    inject_terms = config.getboolean('glossary', 'inject', fallback=False)
+    verify_terms = config.getboolean('glossary', 'verify', fallback=False)
+    glossary_path = BASE_DIR / config['input']['glossary']
+    if (inject_terms or verify_terms) and not glossary_path.exists():
+        # 日英対照表がなければ用語照合をせずに翻訳する
+        logging.warning("日英対照表がないため用語照合を行いません: %s", glossary_path)
+        print(f"日英対照表がないため用語照合を行いません: {glossary_path}")
+        inject_terms = verify_terms = False
+    if inject_terms or verify_terms:
+        matcher = load_glossary_matcher(glossary_path)
+
+    # 段落ごとのシステムプロンプト（翻訳メモリのキーにも使う）
+    def prompt_for(text):
+        return matcher.system_prompt(text, prompt) if inject_terms else prompt
+
+    # 数値・日付・期間・日英対照表と完全一致する段落、日本語を含まない段落は、API を呼ばずに規則で変換する
+    fast_path = None
+    if config.getboolean('fast_path', 'enabled', fallback=False):
+        vocab = None
+        if config.getboolean('fast_path', 'glossary', fallback=True):
+            if glossary_path.exists():
+                vocab = load_glossary(glossary_path)
+            else:
+                logging.warning("日英対照表がないため、ローカル変換で対照表を使いません: %s", glossary_path)
+        fast_path = FastPath(vocab, config.getboolean('fast_path', 'skip_non_japanese', fallback=True))
+
+    # 翻訳メモリに登録済みの原文は API を呼ばずに結果を使う
+    cache = None
+    if config.getboolean('cache', 'enabled', fallback=False):
+        cache = TranslationCache(BASE_DIR / config['cache']['path'],
+                                 config.getint('cache', 'max_entries', fallback=200000))
 
-            translated = translate_text(client, modelID, text)
+    if args.inputs:
+        # 複数文書モード：全文書で1つの翻訳キューを共有し、終わった文書から保存する
+        run_translate_documents(resolve_inputs(args.inputs), os.getenv(env_key), modelID,
+                                concurrency=concurrency, token_budget=token_budget,
+                                limiter=limiter, retry_rounds=retry_rounds,
+                                cache=cache, prompt_for=prompt_for,
+                                matcher=matcher if inject_terms else None,
+                                output_dir=args.output_dir,
+                                workers=args.workers,
+                                max_chunk_tokens=max_chunk_tokens,
+                                fast_path=fast_path,
+                                engine=docx_engine,
+                                verify_matcher=matcher if verify_terms else None)
+        if fast_path:
+            print(fast_path.report())
+            telemetry.record_cache_hit("fast_path", modelID, fast_path.stats()["hits"])
+        if cache:
+            cache.evict()
+            print("翻訳メモリ:", cache.stats())
+            cache.close()
+        telemetry.finish()
+        sys.exit()
 
-            print("-------------------------------------")
-            print("【翻訳】" + translated)
+    if docx_engine == 'stream':
+        # targets は [(段落ID, text), ...]
+        targets = extract_paragraphs(input_path)
+    else:
+        # targets は [(para, text), ...]
+        from docx import Document
+        out = Document(input_path)
+        targets = collect_targets(out)
+
+    # 同じ原文は1回だけ翻訳し、結果をすべての出現箇所に使う
+    segments, segment_ids = group_segments(targets)
+
+    # 翻訳済みの段落はジャーナルに1件ずつ記録する。--resume の時は記録を読み戻して続きから翻訳する。
+    doc_hash = file_hash(input_path)
+    journal_dir = BASE_DIR / config.get('journal', 'dir', fallback='journal')
+    journal = TranslationJournal(journal_dir / f"{doc_hash}.jsonl",
+                                 doc_hash, modelID, resume=args.resume)
+    members = [[] for _ in segments]
+    for i, segment_id in enumerate(segment_ids):
+        members[segment_id].append(i)
+
+    # 前版が指定されていれば、変わっていない段落は前版の翻訳を使う
+    reuse = {}
+    if args.prev_source and args.prev_translated:
+        reuse, diff_stats = align_with_previous(
+            load_previous_pairs(args.prev_source, args.prev_translated),
+            [text for _, text in targets])
+        print("前版との差分:", diff_stats)
+
+    results = [None] * len(segments)
+    pending = []
+    resumed = 0
+    reused = 0
+    local = 0
+    for i, text in enumerate(segments):
+        if fast_path:
+            results[i] = fast_path.translate(text)
+            if results[i] is not None:
+                local += 1
+                continue
+        for member in members[i]:
+            results[i] = journal.lookup(member, targets[member][1])
+            if results[i] is not None:
+                resumed += 1
+                break
+        if results[i] is None:
+            for member in members[i]:
+                results[i] = reuse.get(member)
+                if results[i] is not None:
+                    reused += 1
+                    break
+        if results[i] is None and cache:
+            results[i] = cache.get(modelID, text, system_prompt=prompt_for(text))
+        if results[i] is None:
+            pending.append(i)
+    pending_texts = [segments[i] for i in pending]
+    cache_hits = len(segments) - len(pending) - resumed - reused - local
+    telemetry.record_cache_hit("chat", modelID, cache_hits)
+    telemetry.record_cache_hit("fast_path", modelID, local)
+
+    def on_result(k, translated):
+        for member in members[pending[k]]:
+            journal.record(member, targets[member][1], translated)
+
+    if not pending_texts:
+        # すべて翻訳済み・ローカル変換で済んだ時は API クライアントも作らない（オフラインで完了する）
+        translated_list = []
+    elif concurrency > 1 or token_budget > 0 or limiter:
+        # 全段落を並列に（必要ならまとめて）翻訳し、結果は文書順に書き戻す
+        translated_list = run_translate_all(os.getenv(env_key), modelID,
+                                            pending_texts, concurrency,
+                                            token_budget=token_budget,
+                                            on_result=on_result,
+                                            limiter=limiter,
+                                            retry_rounds=retry_rounds,
+                                            matcher=matcher if inject_terms else None,
+                                            max_chunk_tokens=max_chunk_tokens)
+    else:
+        from openai import OpenAI
+        from tqdm import tqdm
+        client = OpenAI(api_key=os.getenv(env_key))
+        translated_list = []
+        for k, text in enumerate(tqdm(pending_texts)):
+            try:
+                chunks = chunk_text(text, max_chunk_tokens)
+                translated_list.append(join_translations(chunks, [
+                    translate_text(client, modelID, chunk, system_prompt=prompt_for(chunk))
+                    for chunk in chunks]))
+                on_result(k, translated_list[-1])
+            except Exception as e:
+                translated_list.append(e)
+
+    for i, translated in zip(pending, translated_list):
+        results[i] = translated
+        if cache and not isinstance(translated, Exception):
+            cache.put(modelID, segments[i], translated, system_prompt=prompt_for(segments[i]))
 
-            print("-------------------------------------")
+    if limiter:
+        print("再試行回数:", limiter.retries)
+    if cache:
+        cache.evict()
+        print("翻訳メモリ:", cache.stats())
+        cache.close()
+
+    # 用語の対訳が翻訳結果に含まれていない段落を use.log に記録する
+    if verify_terms:
+        flagged = 0
+        for text, translated in zip(segments, results):
+            if isinstance(translated, Exception):
+                continue
+            missing = matcher.missing_terms(text, translated)
+            if missing:
+                flagged += 1
+                logging.warning("用語不一致: %s -> %s / 期待: %s", text, translated,
+                                ", ".join(f"{jp}={en}" for jp, en in missing))
+        print(f"用語チェック: 不一致 {flagged} 件（詳細は use.log）")
+
+    translations = {}
+    for (para, text), segment_id in zip(targets, segment_ids):
+        translated = results[segment_id]
+        print("===========================", env_key, " : ",env_model_id)
+        print("【原文】" + text)
+        if isinstance(translated, Exception):
+            print("翻訳エラー:", translated)
+            continue
+        print("-------------------------------------")
+        print("【翻訳】" + translated)
+
+        print("-------------------------------------")
+        if docx_engine == 'stream':
+            translations[para] = translated
+        else:
             replace_text_preserve_styles(para, translated)
-        except Exception as e:
-            print("翻訳エラー:", e)
 
-    out.save( output_path)
+    print(f"段落数: {len(targets)} / 重複除外後: {len(segments)} / "
+          f"ローカル変換: {local} / ジャーナル: {resumed} / 前版: {reused} / "
+          f"翻訳メモリ: {cache_hits} / "
+          f"API翻訳: {len(pending)} "
+          f"（削減: {len(targets) - len(pending)}）")
+    if fast_path:
+        print(fast_path.report())
+
+    if docx_engine == 'stream':
+        write_translations(input_path, output_path, translations)
+    else:
+        out.save( output_path)
     print("完了:", output_path)
 
-    #pyinstaller --onefile use.py
+    # 全段落を翻訳できた時だけジャーナルを削除する。エラーが残っていれば --resume で再実行できる。
+    if any(isinstance(translated, Exception) for translated in results):
+        journal.close()
+        print("未翻訳の段落があります。--resume で再実行してください。")
+    else:
+        journal.remove()
+    telemetry.finish()
+
+    # 実行ファイルの作成: python build_exe.py（tiktoken のデータを同梱した --onedir 版）